@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 """"
 Description: bgp_eoiu_marker.py -- populating bgp eoiu marker flags in stateDB during warm reboot.
@@ -7,8 +7,16 @@ Description: bgp_eoiu_marker.py -- populating bgp eoiu marker flags in stateDB d
 
     The script check bgp neighbor state via vtysh cli interface periodically (every 1 second).
     It looks for explicit EOR and implicit EOR (keep alive after established) in the json output of show ip bgp neighbors A.B.C.D json
+    All the neighbors are fetched at once with show bgp neighbors json, so a check round runs a single
+    command whatever the number of neighbors.
+    The commands are sent over a single connection to the bgpd vty socket, kept open for the whole run,
+    rather than starting one vtysh per command. vtysh is only used if the socket cannot be connected.
+    With --replay, the commands are answered from a file of canned json outputs instead, so the script can
+    be tested without bgpd.
 
-    Once the script has collected all needed EORs, it set a EOIU flags in stateDB.
+    Once the script has collected all needed EORs of a family, it set the EOIU flag of this family in stateDB,
+    without waiting for the other family. With --per-vrf, the neighbors of all the vrfs are checked and a EOIU
+    flag is also set for every vrf and family as soon as all its neighbors have EOR received.
 
     fpmsyncd may hold a few seconds (2~5 seconds) after getting the flag before starting routing reconciliation.
     2-5 seconds should be enough for all the route to be synced to fpmsyncd from bgp. If not, the system probably is already in wrong state.
@@ -17,16 +25,122 @@ Description: bgp_eoiu_marker.py -- populating bgp eoiu marker flags in stateDB d
 """
 
 import sys
-import swsssdk
+import argparse
 import time
 import syslog
 import traceback
-import commands
+import asyncio
 import json
-from swsscommon import swsscommon
 import errno
 from time import gmtime, strftime
 
+BGPD_VTY_PATH = '/var/run/frr/bgpd.vty'
+
+# Session to the bgpd vty socket, used by vtysh to send commands to bgpd
+# A command is sent as a null terminated string, bgpd answers with the command
+# output followed by 3 null bytes and the command status.
+# The connection is kept open for all the commands, which are run one at a time.
+# If bgpd does not answer a command in time, this and the next commands are run
+# with vtysh instead.
+class BgpdVtySession():
+    CMD_SUCCESS = 0
+
+    # the json outputs of a large number of neighbors are much larger than the default
+    # stream buffer limit
+    READ_LIMIT = 64 * 1024 * 1024
+
+    # seconds to wait for the output of a command
+    COMMAND_TIME_OUT = 30
+
+    def __init__(self, path=BGPD_VTY_PATH):
+        self.path = path
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+        # vtysh session used once bgpd did not answer on the socket
+        self.fallback = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=self.READ_LIMIT)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def run_command(self, cmd):
+        self.writer.write(cmd.encode() + b'\0')
+        await self.writer.drain()
+        output = await self.reader.readuntil(b'\0\0\0')
+        status = (await self.reader.readexactly(1))[0]
+        if status != self.CMD_SUCCESS:
+            raise RuntimeError("bgpd command '{}' failed, status {}".format(cmd, status))
+        return output[:-3].decode()
+
+    # Run a command and return its output, the connection is opened again if it was lost
+    async def command(self, cmd):
+        async with self.lock:
+            if self.fallback is not None:
+                return await self.fallback.command(cmd)
+            if self.writer is None:
+                await self.connect()
+            try:
+                return await asyncio.wait_for(self.run_command(cmd), self.COMMAND_TIME_OUT)
+            except asyncio.TimeoutError:
+                syslog.syslog(syslog.LOG_WARNING, "bgpd did not answer '{}' on {} in {} seconds, using vtysh".format(
+                              cmd, self.path, self.COMMAND_TIME_OUT))
+                self.close()
+                self.fallback = VtyshSession()
+                return await self.fallback.command(cmd)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                self.close()
+                raise
+
+# Run every command in a new vtysh process
+class VtyshSession():
+    async def command(self, cmd):
+        proc = await asyncio.create_subprocess_exec("vtysh", "-c", cmd,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.STDOUT)
+        output, _ = await proc.communicate()
+        return output.decode()
+
+    def close(self):
+        pass
+
+# Stand-in for the bgpd session answering the commands from a json file:
+#   {"<command>": [<output 1>, <output 2>, ...], ...}
+# The outputs of a command are returned one after the other, the last one is repeated
+# once all of them have been returned.
+class ReplayVtySession():
+    def __init__(self, path):
+        with open(path) as f:
+            self.outputs = json.load(f)
+        self.calls = {}
+
+    async def command(self, cmd):
+        if cmd not in self.outputs:
+            raise RuntimeError("no replay output for command '{}'".format(cmd))
+        outputs = self.outputs[cmd]
+        index = self.calls.get(cmd, 0)
+        self.calls[cmd] = index + 1
+        return json.dumps(outputs[min(index, len(outputs) - 1)])
+
+    def close(self):
+        pass
+
+# Open the session used to send commands to bgpd
+async def open_bgpd_session(vty_path=BGPD_VTY_PATH, replay_file=None):
+    if replay_file:
+        return ReplayVtySession(replay_file)
+    session = BgpdVtySession(vty_path)
+    try:
+        await session.connect()
+    except OSError as e:
+        syslog.syslog(syslog.LOG_WARNING, "Failed to connect to {}: {}, using vtysh".format(vty_path, str(e)))
+        return VtyshSession()
+    return session
+
 class BgpStateCheck():
     # timeout the restore process in 120 seconds if not finished
     # This is in consistent with the default timerout for bgp warm restart set in fpmsyncd
@@ -35,7 +149,12 @@ class BgpStateCheck():
 
     # every 1 seconds to check bgp neighbors state
     CHECK_INTERVAL = 1
-    def __init__(self):
+
+    def __init__(self, session=None, per_vrf=False, state_db=None):
+        self.session = session
+        self.per_vrf = per_vrf
+        # (family, vrf) which reached eoiu, with per_vrf
+        self.vrf_eoiu = set()
         self.ipv4_neighbors = []
         self.ipv4_neigh_eor_status = {}
         self.ipv6_neighbors = []
@@ -44,28 +163,46 @@ class BgpStateCheck():
         self.bgp_ipv4_eoiu = False
         self.bgp_ipv6_eoiu = False
         self.get_peers_wt = self.DEF_TIME_OUT
-
-    def get_all_peers(self):
+        # stateDB connection kept for all the marker updates
+        self.db = None
+        self.state_db = state_db
+        if self.state_db is None:
+            # imported here so that BgpStateCheck can run with another stateDB, e.g. in
+            # bgp_eoiu_marker_bench.py, where the SONiC python packages are not installed
+            import swsssdk
+            self.db = swsssdk.SonicV2Connector(host='127.0.0.1')
+            self.db.connect(self.db.STATE_DB, False)
+            self.state_db = self.db.get_redis_client(self.db.STATE_DB)
+
+    # Run a show bgp command, of all the vrfs with per_vrf,
+    # returns the json output as {vrf: vrf output}
+    async def show_bgp(self, cmd):
+        if self.per_vrf:
+            return json.loads(await self.session.command("show bgp vrf all %s json" % cmd))
+        return {"default": json.loads(await self.session.command("show bgp %s json" % cmd))}
+
+    # The neighbors are saved as (vrf, neighbor address)
+    async def get_all_peers(self):
         while self.get_peers_wt >= 0:
             try:
-                cmd = "vtysh -c 'show bgp summary json'"
-                output = commands.getoutput(cmd)
-                peer_info = json.loads(output)
-                if "ipv4Unicast" in peer_info and "peers" in peer_info["ipv4Unicast"]:
-                    self.ipv4_neighbors = peer_info["ipv4Unicast"]["peers"].keys()
+                vrf_peer_info = await self.show_bgp("summary")
+                self.ipv4_neighbors = []
+                self.ipv6_neighbors = []
+                for vrf, peer_info in vrf_peer_info.items():
+                    if "ipv4Unicast" in peer_info and "peers" in peer_info["ipv4Unicast"]:
+                        self.ipv4_neighbors += [(vrf, neigh) for neigh in peer_info["ipv4Unicast"]["peers"]]
 
-                if "ipv6Unicast" in peer_info and "peers" in peer_info["ipv6Unicast"]:
-                    self.ipv6_neighbors = peer_info["ipv6Unicast"]["peers"].keys()
+                    if "ipv6Unicast" in peer_info and "peers" in peer_info["ipv6Unicast"]:
+                        self.ipv6_neighbors += [(vrf, neigh) for neigh in peer_info["ipv6Unicast"]["peers"]]
 
                 syslog.syslog('BGP ipv4 neighbors: {}'.format(self.ipv4_neighbors))
-                syslog.syslog('BGP ipv4 neighbors: {}'.format(self.ipv6_neighbors))
+                syslog.syslog('BGP ipv6 neighbors: {}'.format(self.ipv6_neighbors))
                 return
 
             except Exception:
                 syslog.syslog(syslog.LOG_ERR, "*ERROR* get_all_peers Exception: %s" % (traceback.format_exc()))
-                time.sleep(5)
+                await asyncio.sleep(5)
                 self.get_peers_wt -= 5
-                self.get_all_peers()
         syslog.syslog(syslog.LOG_ERR, "Failed to get bgp neighbor info in {} seconds, exiting".format(self.DEF_TIME_OUT));
         sys.exit(1)
 
@@ -79,32 +216,36 @@ class BgpStateCheck():
     # Set the statedb "BGP_STATE_TABLE|eoiu", so fpmsyncd can get the bgp eoiu signal
     # Only two families: 'ipv4' and 'ipv6'
     # state is "unknown" / "reached" / "consumed"
-    def set_bgp_eoiu_marker(self, family, state):
-        db = swsssdk.SonicV2Connector(host='127.0.0.1')
-        db.connect(db.STATE_DB, False)
+    # state and timestamp are set by a single command, so they are always seen together
+    # If vrf is given, the marker of the family in this vrf "BGP_STATE_TABLE|family|eoiu|vrf" is set
+    def set_bgp_eoiu_marker(self, family, state, vrf=None):
         key = "BGP_STATE_TABLE|%s|eoiu" % family
-        db.set(db.STATE_DB, key, 'state', state)
+        if vrf is not None:
+            key += "|%s" % vrf
         timesamp = strftime("%Y-%m-%d %H:%M:%S", gmtime())
-        db.set(db.STATE_DB, key, 'timestamp', timesamp)
-        db.close(db.STATE_DB)
+        self.state_db.hset(key, mapping={'state': state, 'timestamp': timesamp})
         return
 
     def clean_bgp_eoiu_marker(self):
-        db = swsssdk.SonicV2Connector(host='127.0.0.1')
-        db.connect(db.STATE_DB, False)
-        db.delete(db.STATE_DB, "BGP_STATE_TABLE|IPv4|eoiu")
-        db.delete(db.STATE_DB, "BGP_STATE_TABLE|IPv6|eoiu")
-        db.close(db.STATE_DB)
+        self.state_db.delete("BGP_STATE_TABLE|IPv4|eoiu", "BGP_STATE_TABLE|IPv6|eoiu",
+                             *self.state_db.keys("BGP_STATE_TABLE|*|eoiu|*"))
         syslog.syslog('Cleaned ipv4 and ipv6 eoiu marker flags')
         return
 
-    def bgp_eor_received(self, neigh, is_ipv4):
+    # Get the state of all the bgp neighbors with a single command,
+    # returns {vrf: {neighbor: neighbor state}} or None if it could not be read
+    async def get_all_neighbors_status(self):
+        try:
+            return await self.show_bgp("neighbors")
+        except Exception:
+            syslog.syslog(syslog.LOG_ERR, "*ERROR* get_all_neighbors_status Exception: %s" % (traceback.format_exc()))
+            return None
+
+    # neig_status is the state of the neighbors of the neighbor vrf
+    def bgp_eor_received(self, neigh, neig_status, is_ipv4):
         try:
-            neighstr = "%s" % neigh
+            neighstr = "%s" % neigh[1]
             eor_received = False
-            cmd = "vtysh -c 'show bgp neighbors %s json'" % neighstr
-            output = commands.getoutput(cmd)
-            neig_status = json.loads(output)
             if neighstr in neig_status:
                 if "gracefulRestartInfo" in neig_status[neighstr]:
                     if "endOfRibRecv" in neig_status[neighstr]["gracefulRestartInfo"]:
@@ -120,10 +261,10 @@ class BgpStateCheck():
                 if eor_received == False and "bgpState" in neig_status[neighstr] and neig_status[neighstr]["bgpState"] == "Established":
                     # if "messageStats" in neig_status and "keepalivesRecv" in neig_status["messageStats"]:
                     # it looks we need to record the keepalivesRecv count for detecting count change
-                    if neighstr not in self.keepalivesRecvCnt:
-                        self.keepalivesRecvCnt[neighstr] = neig_status[neighstr]["messageStats"]["keepalivesRecv"]
+                    if neigh not in self.keepalivesRecvCnt:
+                        self.keepalivesRecvCnt[neigh] = neig_status[neighstr]["messageStats"]["keepalivesRecv"]
                     else:
-                        eor_received = (self.keepalivesRecvCnt[neighstr] is not neig_status[neighstr]["messageStats"]["keepalivesRecv"])
+                        eor_received = (self.keepalivesRecvCnt[neigh] != neig_status[neighstr]["messageStats"]["keepalivesRecv"])
                         if eor_received:
                             syslog.syslog('BGP implicit eor received for neighbors: {}'.format(neigh))
 
@@ -131,7 +272,31 @@ class BgpStateCheck():
 
         except Exception:
             syslog.syslog(syslog.LOG_ERR, "*ERROR* bgp_eor_received Exception: %s" % (traceback.format_exc()))
-
+            return False
+
+    # Update the neighbors of a family without EOR yet from the state of all the neighbors
+    def check_peers_eor_status(self, neig_status, neigh_eor_status, is_ipv4):
+        for neigh, eor_status in neigh_eor_status.items():
+            if eor_status == "unknown" and self.bgp_eor_received(neigh, neig_status.get(neigh[0], {}), is_ipv4):
+                neigh_eor_status[neigh] = "rcvd"
+
+    # Set the eoiu marker of the family, and with per_vrf the markers of its vrfs,
+    # as soon as all their neighbors have EOR received
+    # Returns True once the family reached eoiu
+    def update_bgp_eoiu(self, family, neigh_eor_status):
+        if self.per_vrf:
+            unknown_vrfs = set(vrf for (vrf, _), eor_status in neigh_eor_status.items() if eor_status == "unknown")
+            for vrf in set(vrf for vrf, _ in neigh_eor_status) - unknown_vrfs:
+                if (family, vrf) not in self.vrf_eoiu:
+                    self.vrf_eoiu.add((family, vrf))
+                    self.set_bgp_eoiu_marker(family, "reached", vrf)
+                    syslog.syslog("BGP {} eoiu reached in vrf {}".format(family, vrf))
+
+        if "unknown" in neigh_eor_status.values():
+            return False
+        self.set_bgp_eoiu_marker(family, "reached")
+        syslog.syslog("BGP {} eoiu reached".format(family))
+        return True
 
     # This function is to collect eor state based on the saved ipv4_neigh_eor_status and ipv6_neigh_eor_status dictionaries
     # It iterates through the dictionary, and check whether the specific neighbor has EOR received.
@@ -141,33 +306,37 @@ class BgpStateCheck():
     # ipv4 and ipv6 neighbors are processed separately.
     # Once all ipv4 neighbors have EOR received, bgp_ipv4_eoiu becomes True.
     # Once all ipv6 neighbors have EOR received, bgp_ipv6_eoiu becomes True.
+    # The eoiu marker of a family is set in statedb right away (see update_bgp_eoiu).
 
-    # The neighbor EoR states were checked in a loop with an interval (CHECK_INTERVAL)
+    # The neighbor EoR states were checked in a loop with an interval (CHECK_INTERVAL),
+    # the state of all the neighbors of both families is fetched once in every round.
+    # A round starts CHECK_INTERVAL after the previous one started, or right after it
+    # if it took longer than that.
     # The function will timeout in case eoiu states never meet the condition
     # after some time (DEF_TIME_OUT).
-    def wait_for_bgp_eoiu(self):
-        wait_time = self.DEF_TIME_OUT
-        while wait_time >= 0:
+    async def wait_for_bgp_eoiu(self):
+        deadline = time.monotonic() + self.DEF_TIME_OUT
+        while True:
+            round_start = time.monotonic()
+            neig_status = await self.get_all_neighbors_status()
+            if neig_status is not None:
+                if not self.bgp_ipv4_eoiu:
+                    self.check_peers_eor_status(neig_status, self.ipv4_neigh_eor_status, True)
+                if not self.bgp_ipv6_eoiu:
+                    self.check_peers_eor_status(neig_status, self.ipv6_neigh_eor_status, False)
+
             if not self.bgp_ipv4_eoiu:
-                for neigh, eor_status in self.ipv4_neigh_eor_status.items():
-                    if eor_status == "unknown" and self.bgp_eor_received(neigh, True):
-                        self.ipv4_neigh_eor_status[neigh] = "rcvd"
-                if "unknown" not in self.ipv4_neigh_eor_status.values():
-                    self.bgp_ipv4_eoiu = True
-                    syslog.syslog("BGP ipv4 eoiu reached")
+                self.bgp_ipv4_eoiu = self.update_bgp_eoiu("IPv4", self.ipv4_neigh_eor_status)
 
             if not self.bgp_ipv6_eoiu:
-                for neigh, eor_status in self.ipv6_neigh_eor_status.items():
-                    if eor_status == "unknown" and self.bgp_eor_received(neigh, False):
-                        self.ipv6_neigh_eor_status[neigh] = "rcvd"
-                if "unknown" not in self.ipv6_neigh_eor_status.values():
-                    self.bgp_ipv6_eoiu = True
-                    syslog.syslog('BGP ipv6 eoiu reached')
+                self.bgp_ipv6_eoiu = self.update_bgp_eoiu("IPv6", self.ipv6_neigh_eor_status)
 
             if self.bgp_ipv6_eoiu and self.bgp_ipv4_eoiu:
-                break;
-            time.sleep(self.CHECK_INTERVAL)
-            wait_time -= self.CHECK_INTERVAL
+                break
+            next_round = round_start + self.CHECK_INTERVAL
+            if next_round > deadline:
+                break
+            await asyncio.sleep(max(0, next_round - time.monotonic()))
 
         if not self.bgp_ipv6_eoiu:
             syslog.syslog(syslog.LOG_ERR, "BGP ipv6 eoiu not reached: {}".format(self.ipv6_neigh_eor_status));
@@ -175,14 +344,33 @@ class BgpStateCheck():
         if not self.bgp_ipv4_eoiu:
             syslog.syslog(syslog.LOG_ERR, "BGP ipv4 eoiu not reached: {}".format(self.ipv4_neigh_eor_status));
 
+async def check_bgp_eoiu(bgp_state_check, vty_path, replay_file):
+    bgp_state_check.session = await open_bgpd_session(vty_path, replay_file)
+    try:
+        await bgp_state_check.get_all_peers()
+        bgp_state_check.init_peers_eor_status()
+        await bgp_state_check.wait_for_bgp_eoiu()
+    finally:
+        bgp_state_check.session.close()
+
 def main():
+    from swsscommon import swsscommon
 
-    print "bgp_eoiu_marker service is started"
+    parser = argparse.ArgumentParser(description='Set the bgp eoiu marker flags in stateDB during warm reboot')
+    parser.add_argument('--vty-socket', default=BGPD_VTY_PATH,
+                        help='bgpd vty socket (default: %(default)s)')
+    parser.add_argument('--per-vrf', action='store_true',
+                        help='check the neighbors of all the vrfs and set a eoiu marker per vrf')
+    parser.add_argument('--replay',
+                        help='answer the bgpd commands from a json file instead of bgpd, for testing')
+    args = parser.parse_args()
+
+    print("bgp_eoiu_marker service is started")
 
     try:
-        bgp_state_check = BgpStateCheck()
-    except Exception, e:
-        syslog.syslog(syslog.LOG_ERR, "{}: error exit 1, reason {}".format(THIS_MODULE, str(e)))
+        bgp_state_check = BgpStateCheck(per_vrf=args.per_vrf)
+    except Exception as e:
+        syslog.syslog(syslog.LOG_ERR, "bgp_eoiu_marker: error exit 1, reason {}".format(str(e)))
         exit(1)
 
     # Always clean the eoiu marker in stateDB first
@@ -195,26 +383,19 @@ def main():
 
     # if bgp or system warm reboot not enabled, don't run
     if not warmstart.isWarmStart():
-        print "bgp_eoiu_marker service is skipped as warm restart not enabled"
+        print("bgp_eoiu_marker service is skipped as warm restart not enabled")
         return
 
     bgp_state_check.set_bgp_eoiu_marker("IPv4", "unknown")
     bgp_state_check.set_bgp_eoiu_marker("IPv6", "unknown")
-    bgp_state_check.get_all_peers()
-    bgp_state_check.init_peers_eor_status()
     try:
-        bgp_state_check.wait_for_bgp_eoiu()
+        asyncio.run(check_bgp_eoiu(bgp_state_check, args.vty_socket, args.replay))
     except Exception as e:
         syslog.syslog(syslog.LOG_ERR, str(e))
         sys.exit(1)
 
-    # set statedb to signal other processes like fpmsynd
-    if bgp_state_check.bgp_ipv4_eoiu:
-        bgp_state_check.set_bgp_eoiu_marker("IPv4", "reached")
-    if bgp_state_check.bgp_ipv6_eoiu:
-        bgp_state_check.set_bgp_eoiu_marker("IPv6", "reached")
-
-    print "bgp_eoiu_marker service is done"
+    bgp_state_check.db.close(bgp_state_check.db.STATE_DB)
+    print("bgp_eoiu_marker service is done")
     return
 
 if __name__ == '__main__':
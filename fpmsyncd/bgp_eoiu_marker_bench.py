@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+""""
+Description: bgp_eoiu_marker_bench.py -- measure how fast bgp_eoiu_marker.py detects the bgp eoiu.
+    A fake bgpd, run in a child process, answers the show bgp summary/neighbors json commands on a vty socket
+    from a timeline of the neighbors state. BgpStateCheck checks it through its usual bgpd session, and sets
+    the eoiu markers in an in-memory stateDB.
+
+    The timeline is either synthetic, every neighbor getting its EOR at a random time within --converge-time,
+    or recorded in a json file (--timeline):
+        {"summary": <show bgp summary json output>,
+         "neighbors": [[<seconds from start>, <show bgp neighbors json output>], ...],
+         "eoiu": {"IPv4": <seconds from start>, "IPv6": <seconds from start>}}
+    eoiu is the time the last neighbor of the family got its EOR, a neighbors output is answered from its
+    time until the time of the next one.
+
+    For every number of peers, it reports the eoiu detection latency of both families (time from the last
+    EOR to the marker being set) and the cpu time used by the checker.
+
+    Example: bgp_eoiu_marker_bench.py --peers 32 64 128 256 --converge-time 10
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import fnmatch
+import json
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+
+from bgp_eoiu_marker import BgpStateCheck, check_bgp_eoiu
+
+# delay before the timeline starts, to let the fake bgpd start listening
+START_DELAY = 0.5
+
+# Neighbor state as output by show bgp neighbors json, the fields not used by
+# bgp_eoiu_marker are only there to get an output of a realistic size
+def neighbor_state(eor_v4, eor_v6, keepalives):
+    return {
+        "remoteAs": 65100,
+        "localAs": 65000,
+        "nbrExternalLink": True,
+        "hostname": "peer",
+        "bgpVersion": 4,
+        "remoteRouterId": "10.1.0.1",
+        "localRouterId": "10.1.0.32",
+        "bgpState": "Established",
+        "bgpTimerUpMsec": 120000,
+        "bgpTimerUpString": "00:02:00",
+        "bgpTimerUpEstablishedEpoch": 1600000000,
+        "bgpTimerLastRead": 1000,
+        "bgpTimerLastWrite": 1000,
+        "bgpInUpdateElapsedTimeMsecs": 1000,
+        "bgpTimerHoldTimeMsecs": 180000,
+        "bgpTimerKeepAliveIntervalMsecs": 60000,
+        "neighborCapabilities": {
+            "4byteAs": "advertisedAndReceived",
+            "addPath": {"ipv4Unicast": {"rxAdvertisedAndReceived": True},
+                        "ipv6Unicast": {"rxAdvertisedAndReceived": True}},
+            "routeRefresh": "advertisedAndReceivedOldNew",
+            "multiprotocolExtensions": {"ipv4Unicast": {"advertisedAndReceived": True},
+                                        "ipv6Unicast": {"advertisedAndReceived": True}},
+            "gracefulRestart": "advertisedAndReceived",
+            "gracefulRestartRemoteTimerMsecs": 240000,
+            "addressFamiliesByPeer": {"ipv4Unicast": {"preserved": True},
+                                      "ipv6Unicast": {"preserved": True}},
+        },
+        "gracefulRestartInfo": {
+            "endOfRibSend": {"IPv4 Unicast": True, "IPv6 Unicast": True},
+            "endOfRibRecv": {"IPv4 Unicast": eor_v4, "IPv6 Unicast": eor_v6},
+        },
+        "messageStats": {
+            "depthInq": 0,
+            "depthOutq": 0,
+            "opensSent": 1,
+            "opensRecv": 1,
+            "notificationsSent": 0,
+            "notificationsRecv": 0,
+            "updatesSent": 6400,
+            "updatesRecv": 6400,
+            "keepalivesSent": keepalives,
+            "keepalivesRecv": keepalives,
+            "routeRefreshSent": 0,
+            "routeRefreshRecv": 0,
+            "capabilitySent": 0,
+            "capabilityRecv": 0,
+            "totalSent": 6400 + keepalives,
+            "totalRecv": 6400 + keepalives,
+        },
+        "minBtwnAdvertisementRunsTimerMsecs": 0,
+        "addressFamilyInfo": {
+            "ipv4Unicast": {"updateGroupId": 1, "subGroupId": 1, "packetQueueLength": 0,
+                            "commAttriSentToNbr": "extendedAndStandard", "acceptedPrefixCounter": 6400,
+                            "sentPrefixCounter": 6400},
+            "ipv6Unicast": {"updateGroupId": 2, "subGroupId": 2, "packetQueueLength": 0,
+                            "commAttriSentToNbr": "extendedAndStandard", "acceptedPrefixCounter": 6400,
+                            "sentPrefixCounter": 6400},
+        },
+        "connectionsEstablished": 1,
+        "connectionsDropped": 0,
+        "lastResetTimerMsecs": 120000,
+        "lastResetDueTo": "Waiting for peer OPEN",
+        "hostLocal": "10.0.0.0",
+        "portLocal": 179,
+        "hostForeign": "10.0.0.1",
+        "portForeign": 52000,
+        "nexthop": "10.1.0.32",
+        "nexthopGlobal": "fc00::1",
+        "nexthopLocal": "fe80::1",
+        "bgpConnection": "sharedNetwork",
+        "connectRetryTimer": 120,
+        "readThread": "on",
+        "writeThread": "on",
+    }
+
+# Every neighbor has a session of each family, and gets its EOR at a random time
+# within converge_time, EORs are sent separately for the two families
+class SyntheticTimeline():
+    def __init__(self, peers, converge_time, seed):
+        rand = random.Random(seed)
+        self.ipv4_neighbors = ["10.0.%d.%d" % (i // 128, (i % 128) * 2 + 1) for i in range(peers)]
+        self.ipv6_neighbors = ["fc00::%x" % (i * 2 + 1) for i in range(peers)]
+        self.ipv4_eor = {neigh: rand.uniform(0, converge_time) for neigh in self.ipv4_neighbors}
+        self.ipv6_eor = {neigh: rand.uniform(0, converge_time) for neigh in self.ipv6_neighbors}
+        self.eoiu = {"IPv4": max(self.ipv4_eor.values()), "IPv6": max(self.ipv6_eor.values())}
+
+    def summary(self):
+        return {"ipv4Unicast": {"peers": {neigh: {"state": "Established"} for neigh in self.ipv4_neighbors}},
+                "ipv6Unicast": {"peers": {neigh: {"state": "Established"} for neigh in self.ipv6_neighbors}}}
+
+    # keepalives are not changed, the EORs are explicit
+    def neighbors(self, elapsed):
+        output = {}
+        for neigh in self.ipv4_neighbors:
+            output[neigh] = neighbor_state(elapsed >= self.ipv4_eor[neigh], False, 1)
+        for neigh in self.ipv6_neighbors:
+            output[neigh] = neighbor_state(False, elapsed >= self.ipv6_eor[neigh], 1)
+        return output
+
+class RecordedTimeline():
+    def __init__(self, path):
+        with open(path) as f:
+            timeline = json.load(f)
+        self.summary_output = timeline["summary"]
+        self.neighbors_outputs = sorted(timeline["neighbors"], key=lambda output: output[0])
+        self.eoiu = timeline["eoiu"]
+        self.ipv4_neighbors = list(self.summary_output.get("ipv4Unicast", {}).get("peers", {}))
+        self.ipv6_neighbors = list(self.summary_output.get("ipv6Unicast", {}).get("peers", {}))
+
+    def summary(self):
+        return self.summary_output
+
+    def neighbors(self, elapsed):
+        output = self.neighbors_outputs[0][1]
+        for output_time, neighbors_output in self.neighbors_outputs:
+            if output_time > elapsed:
+                break
+            output = neighbors_output
+        return output
+
+# Fake bgpd answering the commands of the timeline on the vty socket, run in a child
+# process so its cpu time is not accounted to the checker
+def run_fake_bgpd(vty_path, timeline, start_time):
+    async def handle_session(reader, writer):
+        while True:
+            try:
+                cmd = (await reader.readuntil(b'\0'))[:-1].decode()
+            except asyncio.IncompleteReadError:
+                break
+            if cmd == "show bgp summary json":
+                output, status = json.dumps(timeline.summary()), 0
+            elif cmd == "show bgp neighbors json":
+                output, status = json.dumps(timeline.neighbors(time.time() - start_time)), 0
+            else:
+                output, status = "% Unknown command: " + cmd, 1
+            writer.write(output.encode() + b'\0\0\0' + bytes([status]))
+            await writer.drain()
+        writer.close()
+
+    async def serve():
+        server = await asyncio.start_unix_server(handle_session, vty_path)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+# In-memory stand-in for the stateDB redis client, records when every marker is set
+class MemoryStateDb():
+    def __init__(self):
+        self.tables = {}
+        self.history = []
+
+    def hset(self, key, mapping):
+        self.tables.setdefault(key, {}).update(mapping)
+        self.history.append((time.time(), key, dict(mapping)))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.tables.pop(key, None)
+
+    def keys(self, pattern):
+        return [key for key in self.tables if fnmatch.fnmatchcase(key, pattern)]
+
+    def reached_time(self, family):
+        for set_time, key, fields in self.history:
+            if key == "BGP_STATE_TABLE|%s|eoiu" % family and fields["state"] == "reached":
+                return set_time
+        return None
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+# Run BgpStateCheck against the timeline, returns the result of the run
+def run_bench(timeline, check_interval):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vty_path = os.path.join(tmp_dir, "bgpd.vty")
+        start_time = time.time() + START_DELAY
+        fake_bgpd = multiprocessing.Process(target=run_fake_bgpd, args=(vty_path, timeline, start_time), daemon=True)
+        fake_bgpd.start()
+        try:
+            while not os.path.exists(vty_path):
+                time.sleep(0.01)
+            time.sleep(max(0, start_time - time.time()))
+
+            state_db = MemoryStateDb()
+            bgp_state_check = BgpStateCheck(state_db=state_db)
+            bgp_state_check.CHECK_INTERVAL = check_interval
+            bgp_state_check.DEF_TIME_OUT = max(timeline.eoiu.values()) + BgpStateCheck.DEF_TIME_OUT
+            bgp_state_check.set_bgp_eoiu_marker("IPv4", "unknown")
+            bgp_state_check.set_bgp_eoiu_marker("IPv6", "unknown")
+            cpu_start = cpu_time()
+            asyncio.run(check_bgp_eoiu(bgp_state_check, vty_path, None))
+            cpu_used = cpu_time() - cpu_start
+        finally:
+            fake_bgpd.terminate()
+            fake_bgpd.join()
+
+    result = {
+        "ipv4_peers": len(timeline.ipv4_neighbors),
+        "ipv6_peers": len(timeline.ipv6_neighbors),
+        "cpu_time": cpu_used,
+    }
+    for family in ("IPv4", "IPv6"):
+        reached_time = state_db.reached_time(family)
+        result[family.lower() + "_latency"] = None if reached_time is None else \
+            reached_time - start_time - timeline.eoiu[family]
+    return result
+
+def format_latency(latency):
+    return "not reached" if latency is None else "{:.3f}".format(latency)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the bgp eoiu detection latency of bgp_eoiu_marker')
+    parser.add_argument('--peers', type=int, nargs='+', default=[32, 64, 128, 256],
+                        help='numbers of peers of the synthetic timelines (default: %(default)s)')
+    parser.add_argument('--converge-time', type=float, default=10,
+                        help='seconds for all the peers of a synthetic timeline to send EOR (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic timelines (default: %(default)s)')
+    parser.add_argument('--timeline', help='run a recorded timeline json file instead of synthetic ones')
+    parser.add_argument('--check-interval', type=float, default=BgpStateCheck.CHECK_INTERVAL,
+                        help='BgpStateCheck check interval in seconds (default: %(default)s)')
+    parser.add_argument('--json', help='also write the results to this json file')
+    args = parser.parse_args()
+
+    if args.timeline:
+        timelines = [RecordedTimeline(args.timeline)]
+    else:
+        timelines = [SyntheticTimeline(peers, args.converge_time, args.seed) for peers in args.peers]
+
+    results = []
+    print("{:>10} {:>10} {:>14} {:>14} {:>10}".format("ipv4 peers", "ipv6 peers", "ipv4 latency", "ipv6 latency",
+                                                     "cpu time"))
+    for timeline in timelines:
+        result = run_bench(timeline, args.check_interval)
+        results.append(result)
+        print("{:>10} {:>10} {:>14} {:>14} {:>10.3f}".format(result["ipv4_peers"], result["ipv6_peers"],
+                                                             format_latency(result["ipv4_latency"]),
+                                                             format_latency(result["ipv6_latency"]),
+                                                             result["cpu_time"]))
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
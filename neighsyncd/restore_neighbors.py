@@ -13,15 +13,23 @@ Description: restore_neighbors.py -- restoring neighbor table into kernel during
 """
 
 import sys
+import argparse
+import mmap
+import os
+import select
+import socket
+import struct
+import threading
 import swsssdk
 import netifaces
 import time
-from pyroute2 import IPRoute, NetlinkError
-from pyroute2.netlink.rtnl import ndmsg
+from itertools import islice
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pyroute2 import IPRoute
+from pyroute2.netlink.rtnl import ndmsg, RTM_NEWLINK, RTM_DELLINK, RTMGRP_LINK, RTMGRP_IPV4_IFADDR, RTMGRP_IPV6_IFADDR
 from socket import AF_INET,AF_INET6
 import logging
-logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
-from scapy.all import conf, in6_getnsma, inet_pton, inet_ntop, in6_getnsmac, get_if_hwaddr, Ether, ARP, IPv6, ICMPv6ND_NS, ICMPv6NDOptSrcLLAddr
 from swsscommon import swsscommon
 import errno
 import syslog
@@ -32,20 +40,33 @@ logger.addHandler(logging.NullHandler())
 
 SYSLOG_IDENTIFIER = 'restore_neighbor'
 
+# syslog is opened once, reopening it for every message slows down the restore
+syslog.openlog(SYSLOG_IDENTIFIER)
+
+log_levels = {'error': syslog.LOG_ERR, 'warning': syslog.LOG_WARNING,
+              'info': syslog.LOG_INFO, 'debug': syslog.LOG_DEBUG}
+log_level = syslog.LOG_INFO
+
+def set_log_level(level):
+    global log_level
+    log_level = log_levels[level]
+    syslog.setlogmask(syslog.LOG_UPTO(log_level))
+
+# per entry messages are only built and logged at debug level
+def is_debug_enabled():
+    return log_level >= syslog.LOG_DEBUG
+
+def log_debug(msg):
+    syslog.syslog(syslog.LOG_DEBUG, msg)
+
 def log_info(msg):
-    syslog.openlog(SYSLOG_IDENTIFIER)
     syslog.syslog(syslog.LOG_INFO, msg)
-    syslog.closelog()
 
 def log_warning(msg):
-    syslog.openlog(SYSLOG_IDENTIFIER)
     syslog.syslog(syslog.LOG_WARNING, msg)
-    syslog.closelog()
 
 def log_error(msg):
-    syslog.openlog(SYSLOG_IDENTIFIER)
     syslog.syslog(syslog.LOG_ERR, msg)
-    syslog.closelog()
 
 # timeout the restore process in 110 seconds if not finished
 # This is mostly to wait for interfaces to be created and up after system warm-reboot
@@ -54,11 +75,81 @@ def log_error(msg):
 # default timeout to 110 seconds.
 DEF_TIME_OUT = 110
 
-# every 5 seconds to check interfaces states
+# interfaces states are re-checked on netlink and STATE_DB notifications, every
+# 5 seconds all waiting interfaces are re-checked in case a notification was missed,
+# even if notifications keep being received
 CHECK_INTERVAL = 5
 
 ip_family = {"IPv4": AF_INET, "IPv6": AF_INET6}
 
+# number of interfaces restored concurrently
+DEF_WORKERS = 8
+
+# number of NEIGH_TABLE keys scanned and fetched per AppDB round trip
+DB_READ_BATCH_SIZE = 512
+
+# restore plan saved before warm reboot, see RestorePlan
+DEF_PLAN_FILE = '/var/warmboot/neigh_restore_plan.bin'
+
+# a restore plan older than this (in seconds) is stale and the AppDB table is used instead
+PLAN_MAX_AGE = 900
+
+# number of RTM_NEWNEIGH requests packed into one netlink socket write
+DEF_NL_BATCH_SIZE = 256
+
+# seconds to wait for the kernel to acknowledge outstanding netlink requests
+NL_ACK_TIME_OUT = 5
+
+# send/receive buffer size of the bulk netlink socket, large enough to hold the
+# ACKs of several batches
+NL_SOCK_BUF_SIZE = 4 * 1024 * 1024
+NL_RECV_SIZE = 64 * 1024
+
+# netlink definitions from linux/netlink.h, linux/rtnetlink.h and linux/neighbour.h
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+RTM_NEWNEIGH = 28
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NDA_DST = 1
+NDA_LLADDR = 2
+SO_SNDBUFFORCE = 32
+SO_RCVBUFFORCE = 33
+
+# same flags as pyroute2 IPRoute.neigh('add', ...), do not overwrite existing entries
+NL_NEIGH_ADD_FLAGS = NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL
+
+# same flags as pyroute2 IPRoute.neigh('replace', ...), used in diff mode for the
+# entries which are in kernel but unresolved or with another mac
+NL_NEIGH_REPLACE_FLAGS = NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE
+
+# kernel neighbor states kept as they are in diff mode, even if the mac differs
+KEEP_NEIGH_STATES = ndmsg.states['reachable'] | ndmsg.states['permanent'] | ndmsg.states['noarp']
+
+# kernel neighbor states replaced in diff mode, even if the mac is the same
+UNRESOLVED_NEIGH_STATES = ndmsg.states['incomplete'] | ndmsg.states['failed']
+
+# default arp/ns packets per second budget of each interface, 0 for no limit
+DEF_PROBE_PPS = 20000
+
+# arp/ns packets sent back to back before the rate budget is checked again
+PROBE_BURST = 64
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86dd
+IPPROTO_ICMPV6 = 58
+ND_NEIGHBOR_SOLICIT = 135
+ND_OPT_SOURCE_LINKADDR = 1
+
+NLMSGHDR = struct.Struct('=LHHLL')
+NLMSGERR = struct.Struct('=i')
+NDMSG = struct.Struct('=BxxxiHBB')
+RTATTR = struct.Struct('=HH')
+
 # return the first ipv4/ipv6 address assigned on intf
 def first_ip_on_intf(intf, family):
     if intf in netifaces.interfaces():
@@ -81,22 +172,122 @@ def is_intf_oper_state_up(intf):
         return True
     return False
 
-def is_intf_up(intf, db):
-    if not is_intf_oper_state_up(intf):
-         return False
-    if 'Vlan' in intf:
-        table_name = 'VLAN_MEMBER_TABLE|{}|*'.format(intf)
-        key = db.keys(db.STATE_DB, table_name)
-        if key is None:
-            log_info ("Vlan member is not yet created")
+# Watch the states of the interfaces waiting for their neighbors to be restored.
+# Link and address changes are received from RTNLGRP_LINK, RTNLGRP_IPV4_IFADDR and
+# RTNLGRP_IPV6_IFADDR netlink notifications, vlan members from STATE_DB VLAN_MEMBER_TABLE
+# keyspace notifications. wait() returns the interfaces whose state may have changed,
+# so they can be restored as soon as they are eligible instead of on a fixed interval.
+class IntfStateWatcher(object):
+    def __init__(self):
+        self.ipr = IPRoute()
+        self.ipr.bind(groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR)
+        self.state_db = swsscommon.DBConnector("STATE_DB", 0)
+        self.vlan_member_table = swsscommon.SubscriberStateTable(self.state_db, "VLAN_MEMBER_TABLE")
+        # written to wake up wait() when an interface restore is finished
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        # vlan name -> set of member names
+        self.vlan_members = {}
+        # initial table content is returned by the subscriber before any notification
+        self.read_vlan_members()
+        # time of the next re-check of all the interfaces
+        self.next_full_check = time.monotonic() + CHECK_INTERVAL
+
+    def is_intf_up(self, intf):
+        if not is_intf_oper_state_up(intf):
             return False
-        if is_intf_up.counter == 0:
-            time.sleep(3*CHECK_INTERVAL)
-            is_intf_up.counter = 1
-        log_info ("intf {} is up".format(intf))
-    return True
+        if 'Vlan' in intf:
+            if not self.vlan_members.get(intf):
+                log_debug ("Vlan member of {} is not yet created".format(intf))
+                return False
+            log_debug ("intf {} is up".format(intf))
+        return True
+
+    # returns the names of the vlans whose members changed
+    def read_vlan_members(self):
+        changed = set()
+        while True:
+            key, op, _ = self.vlan_member_table.pop()
+            if not key:
+                break
+            # key format: "Vlan1000|Ethernet0"
+            vlan, _, member = key.partition('|')
+            members = self.vlan_members.setdefault(vlan, set())
+            if op == 'SET':
+                members.add(member)
+            else:
+                members.discard(member)
+            changed.add(vlan)
+        return changed
+
+    # returns the names of the interfaces reported by the netlink notifications
+    def read_netlink(self):
+        changed = set()
+        for msg in self.ipr.get():
+            if msg['header']['type'] in (RTM_NEWLINK, RTM_DELLINK):
+                intf = msg.get_attr('IFLA_IFNAME')
+            else:
+                try:
+                    intf = socket.if_indextoname(msg['index'])
+                except OSError:
+                    continue
+            if intf:
+                changed.add(intf)
+        return changed
+
+    def wakeup(self):
+        os.write(self.wakeup_w, b'\0')
+
+    # returns True and schedules the next full check if it is due
+    def full_check_due(self):
+        now = time.monotonic()
+        if now < self.next_full_check:
+            return False
+        self.next_full_check = now + CHECK_INTERVAL
+        return True
+
+    # wait up to timeout seconds for a state change or a wakeup(), returns the
+    # interfaces to check again, or None if all the interfaces have to be checked,
+    # at the latest CHECK_INTERVAL after the previous full check
+    def wait(self, timeout):
+        if self.full_check_due():
+            return None
+        fds = [self.ipr.fileno(), self.vlan_member_table.getFd(), self.wakeup_r]
+        deadline = min(time.monotonic() + timeout, self.next_full_check)
+        changed = set()
+        woken = False
+        while True:
+            readable, _, _ = select.select(fds, [], [], max(0, deadline - time.monotonic()))
+            if not readable:
+                return None if self.full_check_due() else changed
+            # once woken up, drain what is readable without waiting
+            while readable:
+                if self.ipr.fileno() in readable:
+                    try:
+                        changed |= self.read_netlink()
+                    except OSError as e:
+                        # notifications were lost, all the interfaces have to be checked
+                        log_warning('Link notifications lost: {}'.format(str(e)))
+                        self.next_full_check = time.monotonic() + CHECK_INTERVAL
+                        return None
+                if self.vlan_member_table.getFd() in readable:
+                    self.vlan_member_table.readData()
+                    changed |= self.read_vlan_members()
+                if self.wakeup_r in readable:
+                    os.read(self.wakeup_r, 4096)
+                    woken = True
+                readable, _, _ = select.select(fds, [], [], 0)
+            # unrelated notifications are ignored until the timeout
+            if changed or woken:
+                return changed
+            if time.monotonic() >= deadline:
+                return None if self.full_check_due() else changed
 
-# read the neigh table from AppDB to memory, format as below
+    def close(self):
+        self.ipr.close()
+        os.close(self.wakeup_r)
+        os.close(self.wakeup_w)
+
+# The neigh table read from AppDB is kept in memory, format as below
 # build map as below, this can efficiently access intf and family groups later
 #       { intf1 -> { { family1 -> [[ip1, mac1], [ip2, mac2] ...] }
 #                    { family2 -> [[ipM, macM], [ipN, macN] ...] } },
@@ -115,95 +306,421 @@ def is_intf_up(intf, db):
 # These alternative solutions would have worse performance because:
 #  1, need iterate the whole list if only one family is up.
 #  2, need check interface state twice due to the split map
+def add_neigh_to_map(intf_neigh_map, intf_name, family, dst_ip, dmac):
+    intf_neigh_map.setdefault(intf_name, {}).setdefault(family, []).append([dst_ip, dmac])
 
-def read_neigh_table_to_maps():
+# Stream the neigh table from AppDB as (intf, family, ip, mac) records
+# The keys are walked with a SCAN cursor instead of a blocking KEYS, and fetched with
+# pipelined HGETALLs, batch_size keys per round trip. Records are yielded as soon as
+# their batch arrives, so restoring can start before the whole table is read.
+def read_neigh_table(batch_size=DB_READ_BATCH_SIZE):
     db = swsssdk.SonicV2Connector(host='127.0.0.1')
     db.connect(db.APPL_DB, False)
+    client = db.get_redis_client(db.APPL_DB)
 
-    intf_neigh_map = {}
-    # Key format: "NEIGH_TABLE:intf-name:ipv4/ipv6", examples below:
-    # "NEIGH_TABLE:Ethernet122:100.1.1.200"
-    # "NEIGH_TABLE:Ethernet122:fe80::2e0:ecff:fe3b:d6ac"
-    # Value format:
-    # 1) "neigh"
-    # 2) "00:22:33:44:55:cc"
-    # 3) "family"
-    # 4) "IPv4" or "IPv6"
-    keys = db.keys(db.APPL_DB, 'NEIGH_TABLE:*')
-    keys = [] if keys is None else keys
-    for key in keys:
-        key_split = key.split(':', 2)
-        intf_name = key_split[1]
-        if intf_name == 'lo':
-            continue
-        dst_ip = key_split[2]
-        value = db.get_all(db.APPL_DB, key)
-        if 'neigh' in value and 'family' in value:
-            dmac = value['neigh']
-            family = value['family']
-        else:
-            raise RuntimeError('Neigh table format is incorrect')
+    # SCAN may return a key more than once
+    seen = set()
+    cursor = 0
+    try:
+        while True:
+            cursor, keys = client.scan(cursor, match='NEIGH_TABLE:*', count=batch_size)
+            keys = [key for key in keys if key not in seen]
+            seen.update(keys)
+            if keys:
+                pipe = client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hgetall(key)
+                for key, value in zip(keys, pipe.execute()):
+                    # entry removed since the scan
+                    if not value:
+                        continue
+                    yield parse_neigh_entry(key, value)
+            if int(cursor) == 0:
+                break
+    finally:
+        db.close(db.APPL_DB)
 
-        if family not in ip_family:
-            raise RuntimeError('Neigh table format is incorrect')
+# Key format: "NEIGH_TABLE:intf-name:ipv4/ipv6", examples below:
+# "NEIGH_TABLE:Ethernet122:100.1.1.200"
+# "NEIGH_TABLE:Ethernet122:fe80::2e0:ecff:fe3b:d6ac"
+# Value format:
+# 1) "neigh"
+# 2) "00:22:33:44:55:cc"
+# 3) "family"
+# 4) "IPv4" or "IPv6"
+def parse_neigh_entry(key, value):
+    key_split = key.split(':', 2)
+    intf_name = key_split[1]
+    dst_ip = key_split[2]
+    if 'neigh' in value and 'family' in value:
+        dmac = value['neigh']
+        family = value['family']
+    else:
+        raise RuntimeError('Neigh table format is incorrect')
+
+    if family not in ip_family:
+        raise RuntimeError('Neigh table format is incorrect')
+
+    return intf_name, family, dst_ip, dmac
+
+# Neighbor restore plan saved to disk before warm reboot.
+#
+# The neigh table is already grouped by interface and family when the plan is saved,
+# so after reboot it can be mmap-ed and restored right away, without reading and
+# parsing every AppDB key. The file layout is (native byte order):
+#   header:  magic "NRPL", version, creation time, number of groups, number of entries
+#   groups:  interface name, ifindex hint, address family, first entry, number of entries
+#   ips:     16 bytes per entry, IPv4 addresses use the first 4 bytes
+#   macs:    6 bytes per entry
+# The ifindex hint is the interface index when the plan was saved, it is used when the
+# interface still has the same index (e.g. swss only restart).
+# The plan is removed once loaded, a missing, corrupted or stale plan is ignored and
+# the neigh table is read from AppDB.
+class RestorePlan(object):
+    HEADER = struct.Struct('=4sHxxdII')
+    GROUP = struct.Struct('=16sIBxxxII')
+    MAGIC = b'NRPL'
+    VERSION = 1
+    IP_SIZE = 16
+    MAC_SIZE = 6
+
+    def __init__(self, mm, n_groups, n_entries):
+        self.mm = mm
+        self.n_groups = n_groups
+        self.n_entries = n_entries
+        # intf -> ifindex when the plan was saved
+        self.ifindex_hints = {}
+        for _, intf, ifindex, _, _, _ in self.groups():
+            self.ifindex_hints[intf] = ifindex
+
+    @classmethod
+    def save(cls, path, neigh_records):
+        intf_neigh_map = {}
+        for record in neigh_records:
+            add_neigh_to_map(intf_neigh_map, *record)
+
+        groups = bytearray()
+        ips = bytearray()
+        macs = bytearray()
+        n_groups = 0
+        n_entries = 0
+        for intf, family_neigh_map in intf_neigh_map.items():
+            try:
+                ifindex = socket.if_nametoindex(intf)
+            except OSError:
+                ifindex = 0
+            for family, neigh_list in family_neigh_map.items():
+                family_af_inet = ip_family[family]
+                groups += cls.GROUP.pack(intf.encode(), ifindex, family_af_inet, n_entries, len(neigh_list))
+                for dst_ip, dmac in neigh_list:
+                    ips += socket.inet_pton(family_af_inet, dst_ip).ljust(cls.IP_SIZE, b'\0')
+                    macs += bytes.fromhex(dmac.replace(':', ''))
+                n_groups += 1
+                n_entries += len(neigh_list)
+
+        # write to a temporary file first, so a partial plan is never loaded
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, time.time(), n_groups, n_entries))
+            f.write(groups)
+            f.write(ips)
+            f.write(macs)
+        os.rename(tmp_path, path)
+        return n_entries
 
-        # build map like this:
-        #       { intf1 -> { { family1 -> [[ip1, mac1], [ip2, mac2] ...] }
-        #                    { family2 -> [[ipM, macM], [ipN, macN] ...] } },
-        #         intfX -> {...}
-        #       }
-        ip_mac_pair = []
-        ip_mac_pair.append(dst_ip)
-        ip_mac_pair.append(dmac)
+    # returns the plan saved at path, or None if it can't be used
+    @classmethod
+    def load(cls, path, max_age=PLAN_MAX_AGE):
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # the mapping is kept, a plan is only used once
+            os.remove(path)
+        except (OSError, ValueError) as e:
+            log_info('Neighbor restore plan {} is not available: {}'.format(path, str(e)))
+            return None
 
-        intf_neigh_map.setdefault(intf_name, {}).setdefault(family, []).append(ip_mac_pair)
-    db.close(db.APPL_DB)
-    return intf_neigh_map
+        if len(mm) >= cls.HEADER.size:
+            magic, version, created, n_groups, n_entries = cls.HEADER.unpack_from(mm, 0)
+            size = (cls.HEADER.size + n_groups * cls.GROUP.size +
+                    n_entries * (cls.IP_SIZE + cls.MAC_SIZE))
+            if magic == cls.MAGIC and version == cls.VERSION and len(mm) == size:
+                age = time.time() - created
+                if 0 <= age <= max_age:
+                    return cls(mm, n_groups, n_entries)
+                log_warning('Neighbor restore plan {} is stale, created {} seconds ago'.format(path, int(age)))
+                mm.close()
+                return None
+        log_warning('Neighbor restore plan {} is corrupted'.format(path))
+        mm.close()
+        return None
 
+    # yields (family, intf, ifindex, address family, first entry, number of entries) per group
+    def groups(self):
+        offset = self.HEADER.size
+        for _ in range(self.n_groups):
+            name, ifindex, family_af_inet, first, count = self.GROUP.unpack_from(self.mm, offset)
+            family = 'IPv4' if family_af_inet == AF_INET else 'IPv6'
+            yield family, name.rstrip(b'\0').decode(), ifindex, family_af_inet, first, count
+            offset += self.GROUP.size
+
+    # yields the (intf, family, ip, mac) records, group by group, the plan is closed
+    # once they are all read, or when the reader stops early or fails
+    def records(self):
+        ips_offset = self.HEADER.size + self.n_groups * self.GROUP.size
+        macs_offset = ips_offset + self.n_entries * self.IP_SIZE
+        ip_len = {AF_INET: 4, AF_INET6: 16}
+        # the view is released before the mapping is closed
+        with self.mm, memoryview(self.mm) as mm:
+            for family, intf, _, family_af_inet, first, count in self.groups():
+                for i in range(first, first + count):
+                    ip_start = ips_offset + i * self.IP_SIZE
+                    mac_start = macs_offset + i * self.MAC_SIZE
+                    dst_ip = socket.inet_ntop(family_af_inet, mm[ip_start:ip_start + ip_len[family_af_inet]])
+                    dmac = ':'.join('{:02x}'.format(b) for b in mm[mac_start:mac_start + self.MAC_SIZE])
+                    yield intf, family, dst_ip, dmac
+
+# encode a netlink route attribute, padded to 4 bytes
+def nl_attr(attr_type, data):
+    attr = RTATTR.pack(RTATTR.size + len(data), attr_type) + data
+    return attr + b'\0' * (-len(attr) % 4)
 
 # Use netlink to set neigh table into kernel, not overwrite the existing ones
-def set_neigh_in_kernel(ipclass, family, intf_idx, dst_ip, dmac):
-    log_info('Add neighbor entries: family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-    family, intf_idx, dst_ip, dmac))
+#
+# Instead of a blocking request/ACK round trip per entry, the RTM_NEWNEIGH requests
+# are encoded into one buffer and written to the netlink socket with a single sendto()
+# per batch. Every request carries its own sequence number and asks for an ACK, the
+# ACKs are collected from the socket afterwards and matched back to their entry, so
+# EEXIST and other errors are still reported per entry.
+class NeighBatchWriter(object):
+    def __init__(self, batch_size=DEF_NL_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        for force_opt, opt in ((SO_SNDBUFFORCE, socket.SO_SNDBUF), (SO_RCVBUFFORCE, socket.SO_RCVBUF)):
+            # the *FORCE options ignore the rmem_max/wmem_max limits, they need CAP_NET_ADMIN
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, force_opt, NL_SOCK_BUF_SIZE)
+            except OSError:
+                self.sock.setsockopt(socket.SOL_SOCKET, opt, NL_SOCK_BUF_SIZE)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        self.buf = []
+        # seq -> (family, intf_idx, dst_ip, dmac, replace) of the requests not acknowledged yet
+        self.pending = {}
+        self.added = 0
+        self.updated = 0
+        self.exists = 0
+        self.failed = 0
 
-    if family not in ip_family:
-        return
+    # queue one neighbor entry, the batch is written once it is full
+    # if replace is set, an existing entry is overwritten
+    def add(self, family, intf_idx, dst_ip, dmac, replace=False):
+        if family not in ip_family:
+            return
 
-    family_af_inet = ip_family[family]
-    # Add neighbor to kernel with "stale" state, we will send arp/ns packet later
-    # so if the neighbor is active, it will become "reachable", otherwise, it will
-    # stay at "stale" state and get aged out by kernel.
-    try :
-        ipclass.neigh('add',
-            family=family_af_inet,
-            dst=dst_ip,
-            lladdr=dmac,
-            ifindex=intf_idx,
-            state=ndmsg.states['stale'])
-
-    # If neigh exists, log it but no exception raise, other exceptions, raise
-    except NetlinkError as e:
-        if e.code == errno.EEXIST:
-            log_warning('Neigh exists in kernel with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-            family, intf_idx, dst_ip, dmac))
+        family_af_inet = ip_family[family]
+        # Add neighbor to kernel with "stale" state, we will send arp/ns packet later
+        # so if the neighbor is active, it will become "reachable", otherwise, it will
+        # stay at "stale" state and get aged out by kernel.
+        payload = NDMSG.pack(family_af_inet, intf_idx, ndmsg.states['stale'], 0, 0)
+        payload += nl_attr(NDA_DST, socket.inet_pton(family_af_inet, dst_ip))
+        payload += nl_attr(NDA_LLADDR, bytes.fromhex(dmac.replace(':', '')))
+
+        self.seq += 1
+        self.buf.append(NLMSGHDR.pack(NLMSGHDR.size + len(payload), RTM_NEWNEIGH,
+                                      NL_NEIGH_REPLACE_FLAGS if replace else NL_NEIGH_ADD_FLAGS,
+                                      self.seq, 0) + payload)
+        self.pending[self.seq] = (family, intf_idx, dst_ip, dmac, replace)
+        if len(self.buf) >= self.batch_size:
+            self.send()
+
+    # write the queued requests to the socket and pick up the ACKs already available
+    def send(self):
+        if self.buf:
+            self.sock.sendto(b''.join(self.buf), (0, 0))
+            self.buf = []
+        # rtnetlink handles the requests synchronously in sendto(), so the ACKs are
+        # normally queued by now and can be read without blocking
+        self.collect(block=False)
+
+    # send everything queued and wait until all requests are acknowledged
+    def flush(self):
+        self.send()
+        self.collect(block=True)
+
+    def collect(self, block):
+        while self.pending:
+            if block:
+                readable, _, _ = select.select([self.sock], [], [], NL_ACK_TIME_OUT)
+                if not readable:
+                    self.drop_pending('no ACK received from kernel')
+                    return
+            try:
+                data = self.sock.recv(NL_RECV_SIZE, 0 if block else socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # receive buffer overrun, the kernel dropped some of the ACKs
+                if e.errno == errno.ENOBUFS:
+                    self.drop_pending('netlink ACK lost')
+                    return
+                raise
+            self.parse_acks(data)
+
+    def parse_acks(self, data):
+        offset = 0
+        while offset + NLMSGHDR.size <= len(data):
+            msg_len, msg_type, _, seq, _ = NLMSGHDR.unpack_from(data, offset)
+            if msg_len < NLMSGHDR.size:
+                break
+            if msg_type == NLMSG_ERROR:
+                code = -NLMSGERR.unpack_from(data, offset + NLMSGHDR.size)[0]
+                entry = self.pending.pop(seq, None)
+                if entry is not None:
+                    self.report(entry, code)
+            offset += (msg_len + 3) & ~3
+
+    # If neigh exists, log it, other errors are logged and counted per entry
+    def report(self, entry, code):
+        family, intf_idx, dst_ip, dmac, replace = entry
+        if code == 0:
+            if replace:
+                self.updated += 1
+            else:
+                self.added += 1
+        elif code == errno.EEXIST:
+            self.exists += 1
+            if is_debug_enabled():
+                log_debug('Neigh exists in kernel with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                family, intf_idx, dst_ip, dmac))
         else:
-            raise
-
-# build ARP or NS packets depending on family
-def build_arp_ns_pkt(family, smac, src_ip, dst_ip):
-    if family == 'IPv4':
-        eth = Ether(src=smac, dst='ff:ff:ff:ff:ff:ff')
-        pkt = eth/ARP(op='who-has', pdst=dst_ip, psrc=src_ip, hwsrc=smac)
-    elif family == 'IPv6':
-        nsma = in6_getnsma(inet_pton(AF_INET6, dst_ip))
-        mcast_dst_ip = inet_ntop(AF_INET6, nsma)
-        dmac = in6_getnsmac(nsma)
-        eth = Ether(src=smac,dst=dmac)
-        ipv6 = IPv6(src=src_ip, dst=mcast_dst_ip)
-        ns = ICMPv6ND_NS(tgt=dst_ip)
-        ns_opt = ICMPv6NDOptSrcLLAddr(lladdr=smac)
-        pkt = eth/ipv6/ns/ns_opt
-    return pkt
+            self.failed += 1
+            log_error('Failed to add neigh with family: {}, intf_idx: {}, ip: {}, mac: {}, error: {}'.format(
+            family, intf_idx, dst_ip, dmac, os.strerror(code)))
+
+    def drop_pending(self, reason):
+        for family, intf_idx, dst_ip, dmac, _ in self.pending.values():
+            self.failed += 1
+            log_error('Unknown result adding neigh with family: {}, intf_idx: {}, ip: {}, mac: {}, {}'.format(
+            family, intf_idx, dst_ip, dmac, reason))
+        self.pending.clear()
+
+    def close(self):
+        self.sock.close()
+
+# return the index of intf, ifindex_hint is used if the interface still has this index
+def get_intf_index(intf, ifindex_hint=0):
+    if ifindex_hint:
+        try:
+            if socket.if_indextoname(ifindex_hint) == intf:
+                return ifindex_hint
+        except OSError:
+            pass
+    return socket.if_nametoindex(intf)
+
+# return the mac address of intf
+def get_intf_mac(intf):
+    with open('/sys/class/net/{0}/address'.format(intf), 'r') as f:
+        return f.readline().rstrip()
+
+# fold a 32 bits sum of 16 bits words into the internet checksum
+def inet_checksum(total):
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+# sum of the 16 bits words in data, data length is even
+def sum_words(data):
+    return sum(struct.unpack('!{}H'.format(len(data) // 2), data))
+
+# Send ARP requests or NS packets to update the neighbors in kernel.
+#
+# Packets are not built per neighbor: one frame per family is serialized from a
+# template when the source address is known, then only the target address bytes
+# (and for NS the solicited-node multicast destination and the ICMPv6 checksum) are
+# patched for each neighbor. Frames are written to a raw AF_PACKET socket bound to the
+# interface, in bursts of PROBE_BURST packets paced by a token bucket of pps packets
+# per second, so a large neighbor table is refreshed quickly without flooding the
+# control plane.
+class NeighProber(object):
+    # byte offsets of the fields patched in the templates
+    ARP_TPA = slice(38, 42)
+    NS_ETH_DST = slice(3, 6)
+    NS_IP6_DST = slice(51, 54)
+    NS_CKSUM = slice(56, 58)
+    NS_TARGET = slice(62, 78)
+
+    def __init__(self, intf, src_mac, pps=DEF_PROBE_PPS):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        self.sock.bind((intf, 0))
+        self.intf = intf
+        self.smac = bytes.fromhex(src_mac.replace(':', ''))
+        self.pps = pps
+        self.tokens = PROBE_BURST
+        self.last = time.monotonic()
+        self.sent = 0
+        self.dropped = 0
+
+    def arp_template(self, src_ip):
+        eth = b'\xff' * 6 + self.smac + struct.pack('!H', ETH_P_ARP)
+        arp = struct.pack('!HHBBH', 1, ETH_P_IP, 6, 4, 1) + self.smac
+        arp += socket.inet_pton(AF_INET, src_ip) + b'\0' * 6 + b'\0' * 4
+        return bytearray(eth + arp)
+
+    # return the NS frame template and the checksum sum of its constant part,
+    # including the pseudo header
+    def ns_template(self, src_ip):
+        src = socket.inet_pton(AF_INET6, src_ip)
+        dst = socket.inet_pton(AF_INET6, 'ff02::1:ff00:0')
+        icmp = struct.pack('!BBHI', ND_NEIGHBOR_SOLICIT, 0, 0, 0) + b'\0' * 16
+        icmp += struct.pack('!BB', ND_OPT_SOURCE_LINKADDR, 1) + self.smac
+        eth = b'\x33\x33\xff\0\0\0' + self.smac + struct.pack('!H', ETH_P_IPV6)
+        ipv6 = struct.pack('!IHBB', 6 << 28, len(icmp), IPPROTO_ICMPV6, 255) + src + dst
+        pseudo = src + dst + struct.pack('!I3xB', len(icmp), IPPROTO_ICMPV6)
+        return bytearray(eth + ipv6 + icmp), sum_words(pseudo + icmp)
+
+    def probe(self, family, src_ip, dst_ips):
+        if family == 'IPv4':
+            frame = self.arp_template(src_ip)
+            for dst_ip in dst_ips:
+                frame[self.ARP_TPA] = socket.inet_pton(AF_INET, dst_ip)
+                self.send(frame)
+        elif family == 'IPv6':
+            frame, base_sum = self.ns_template(src_ip)
+            for dst_ip in dst_ips:
+                target = socket.inet_pton(AF_INET6, dst_ip)
+                frame[self.NS_TARGET] = target
+                frame[self.NS_ETH_DST] = target[13:]
+                frame[self.NS_IP6_DST] = target[13:]
+                # the solicited-node address adds the low 24 bits of the target to the sum
+                total = base_sum + sum_words(target) + target[13] + (target[14] << 8 | target[15])
+                frame[self.NS_CKSUM] = struct.pack('!H', inet_checksum(total))
+                self.send(frame)
+
+    def send(self, frame):
+        if self.pps and self.tokens < 1:
+            self.wait_budget()
+        try:
+            self.sock.send(frame)
+            self.sent += 1
+        except OSError as e:
+            self.dropped += 1
+            log_warning('Failed to send arp/ns packet on {}: {}'.format(self.intf, str(e)))
+        self.tokens -= 1
+
+    # refill the token bucket, sleep until a full burst can be sent
+    def wait_budget(self):
+        now = time.monotonic()
+        self.tokens = min(PROBE_BURST, self.tokens + (now - self.last) * self.pps)
+        if self.tokens < 1:
+            time.sleep((PROBE_BURST - self.tokens) / self.pps)
+            now = time.monotonic()
+            self.tokens = PROBE_BURST
+        self.last = now
+
+    def close(self):
+        self.sock.close()
 
 # Set the statedb "NEIGH_RESTORE_TABLE|Flags", so neighsyncd can start reconciliation
 def set_statedb_neigh_restore_done():
@@ -213,62 +730,396 @@ def set_statedb_neigh_restore_done():
     db.close(db.STATE_DB)
     return
 
+# Dump the kernel neighbor table once with RTM_GETNEIGH for diff mode, as
+#   { (intf, family, packed ip) -> (mac, state) }
+def dump_kernel_neighbors():
+    ifnames = dict(socket.if_nameindex())
+    kernel_neighs = {}
+    ipclass = IPRoute()
+    try:
+        for family, family_af_inet in ip_family.items():
+            for msg in ipclass.get_neighbours(family=family_af_inet):
+                intf = ifnames.get(msg['ifindex'])
+                dst_ip = msg.get_attr('NDA_DST')
+                if intf and dst_ip:
+                    key = (intf, family, socket.inet_pton(family_af_inet, dst_ip))
+                    kernel_neighs[key] = (msg.get_attr('NDA_LLADDR'), msg['state'])
+    finally:
+        ipclass.close()
+    log_info('Kernel neighbor table dumped with {} entries'.format(len(kernel_neighs)))
+    return kernel_neighs
+
+# Compare the saved neighbors of intf/family with the kernel neighbor table, returns
+# the [(ip, mac, replace)] entries to program:
+#  - entries missing in kernel are added
+#  - entries unresolved in kernel (incomplete/failed), or not confirmed (stale, delay,
+#    probe) with another mac, are replaced with the saved mac
+#  - other entries are already up to date, or were learnt by kernel since, and are skipped
+def diff_kernel_neighbors(intf, family, neigh_list, kernel_neighs):
+    family_af_inet = ip_family[family]
+    program_list = []
+    for dst_ip, dmac in neigh_list:
+        kernel_neigh = kernel_neighs.get((intf, family, socket.inet_pton(family_af_inet, dst_ip)))
+        if kernel_neigh is None:
+            program_list.append((dst_ip, dmac, False))
+            continue
+        lladdr, state = kernel_neigh
+        if state & KEEP_NEIGH_STATES:
+            continue
+        if not state & UNRESOLVED_NEIGH_STATES and lladdr and lladdr.lower() == dmac.lower():
+            continue
+        program_list.append((dst_ip, dmac, True))
+    return program_list
+
+# Set the statedb "NEIGH_RESTORE_TABLE|Stats" with the restore phase timings (seconds)
+# and counters, and log them as one summary record:
+#   db_read_time:      time spent reading the neigh table
+#   wait_for_up_time:  longest time an interface took to come up, wait_for_up_intf
+#   netlink_add_time:  time spent adding neighbors to kernel, summed over interfaces
+#   probe_send_time:   time spent sending arp/ns packets, summed over interfaces
+#   complete_time:     time from start until neighsyncd was signalled
+#   total_time:        time from start to end of the restore
+#   restored / exists / failed:  entries added to kernel / already in kernel / failed
+#   updated / unchanged:  diff mode, entries replaced in kernel / already up to date
+#   skipped / timed_out:  entries not restored / not restored before the timeout
+def set_statedb_neigh_restore_stats(report, total_time):
+    stats = {
+        'db_read_time': '{:.3f}'.format(report['db_read_time']),
+        'wait_for_up_time': '{:.3f}'.format(report['wait_for_up_time']),
+        'wait_for_up_intf': report['wait_for_up_intf'] or '',
+        'netlink_add_time': '{:.3f}'.format(report['netlink_add_time']),
+        'probe_send_time': '{:.3f}'.format(report['probe_send_time']),
+        'complete_time': '{:.3f}'.format(report['complete_time']),
+        'total_time': '{:.3f}'.format(total_time),
+        'restored': str(report['added']),
+        'updated': str(report['updated']),
+        'unchanged': str(report['unchanged']),
+        'exists': str(report['exists']),
+        'failed': str(report['failed']),
+        'skipped': str(report['skipped']),
+        'timed_out': str(report['timed_out']),
+        'restored_intfs': str(report['restored_intfs']),
+        'pending_intfs': str(report['pending_intfs']),
+        'probes_sent': str(report['probes_sent']),
+        'probes_dropped': str(report['probes_dropped']),
+    }
+    log_info('Neighbor restore summary: {}'.format(
+        ', '.join('{}: {}'.format(field, value) for field, value in stats.items())))
+
+    db = swsssdk.SonicV2Connector(host='127.0.0.1')
+    db.connect(db.STATE_DB, False)
+    db.get_redis_client(db.STATE_DB).hmset('NEIGH_RESTORE_TABLE|Stats', stats)
+    db.close(db.STATE_DB)
+
+# Restore the neighbors of intf per family, once the interface is operational up.
+# If the interface has IP configured per IP family, the neighbors of the family are
+# set in kernel from saved entries first, then arp/nd packets are sent to update them.
+# Neighbors are added to the kernel in batches of nl_batch_size netlink requests, all
+# entries of a family are acknowledged before the arp/ns packets are sent for them,
+# at most probe_pps packets per second on each interface.
+# In diff mode (kernel_neighs is given), only the entries missing or changed in kernel
+# are programmed and probed, see diff_kernel_neighbors.
+# Returns the number of restored entries per family, the probe counters and the time
+# spent adding the neighbors and sending the probes.
+def restore_intf_neighbors(intf, family_neigh_map, nl_writer, probe_pps, ifindex_hint=0, kernel_neighs=None):
+    restored = {}
+    counters = Counter()
+    src_mac = get_intf_mac(intf)
+    intf_idx = get_intf_index(intf, ifindex_hint)
+    # create socket per intf to send packets
+    prober = NeighProber(intf, src_mac, probe_pps)
+
+    # Only two families: 'IPv4' and 'IPv6'
+    for family in ip_family.keys():
+        # if ip address assigned and if we have neighs in this family, restore them
+        src_ip = first_ip_on_intf(intf, family)
+        if src_ip and (family in family_neigh_map):
+            neigh_list = family_neigh_map[family]
+            if kernel_neighs is not None:
+                program_list = diff_kernel_neighbors(intf, family, neigh_list, kernel_neighs)
+                counters['unchanged'] += len(neigh_list) - len(program_list)
+            else:
+                program_list = [(dst_ip, dmac, False) for dst_ip, dmac in neigh_list]
+            if is_debug_enabled():
+                for dst_ip, dmac, replace in program_list:
+                    log_debug('{} neighbor entries: family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                    'Replace' if replace else 'Add', family, intf_idx, dst_ip, dmac))
+            phase_start = time.monotonic()
+            for dst_ip, dmac, replace in program_list:
+                # use netlink to set neighbor entries
+                nl_writer.add(family, intf_idx, dst_ip, dmac, replace)
+            nl_writer.flush()
+            counters['netlink_add_time'] += time.monotonic() - phase_start
+
+            if is_debug_enabled():
+                for dst_ip, dmac, _ in program_list:
+                    log_debug('Sending Neigh with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                    family, intf_idx, dst_ip, dmac))
+            phase_start = time.monotonic()
+            # sending arp/ns packets to update kernel neigh info
+            prober.probe(family, src_ip, [dst_ip for dst_ip, _, _ in program_list])
+            counters['probe_send_time'] += time.monotonic() - phase_start
+            restored[family] = len(neigh_list)
+    # close the pkt socket
+    prober.close()
+    counters['probes_sent'] += prober.sent
+    counters['probes_dropped'] += prober.dropped
+    return restored, counters
+
+# Pool of threads restoring independent interfaces concurrently.
+# Every worker thread owns its netlink socket, packet sockets are owned by the
+# interface being restored. The counters of all the workers are merged into one
+# report once the pool is closed.
+class RestoreWorkers(object):
+    def __init__(self, workers, nl_batch_size, probe_pps, on_done, ifindex_hints=None, kernel_neighs=None):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='restore_neighbors')
+        self.nl_batch_size = nl_batch_size
+        self.probe_pps = probe_pps
+        self.ifindex_hints = ifindex_hints or {}
+        self.kernel_neighs = kernel_neighs
+        self.on_done = on_done
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.nl_writers = []
+        self.counters = Counter()
+
+    def get_nl_writer(self):
+        nl_writer = getattr(self.local, 'nl_writer', None)
+        if nl_writer is None:
+            nl_writer = NeighBatchWriter(self.nl_batch_size)
+            self.local.nl_writer = nl_writer
+            with self.lock:
+                self.nl_writers.append(nl_writer)
+        return nl_writer
+
+    def run(self, intf, family_neigh_map):
+        return restore_intf_neighbors(intf, family_neigh_map, self.get_nl_writer(), self.probe_pps,
+                                      self.ifindex_hints.get(intf, 0), self.kernel_neighs)
+
+    def submit(self, intf, family_neigh_map):
+        future = self.executor.submit(self.run, intf, family_neigh_map)
+        future.add_done_callback(lambda _: self.on_done())
+        return future
+
+    # wait for the running restores and return the merged counters
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for nl_writer in self.nl_writers:
+            self.counters['added'] += nl_writer.added
+            self.counters['updated'] += nl_writer.updated
+            self.counters['exists'] += nl_writer.exists
+            self.counters['failed'] += nl_writer.failed
+            nl_writer.close()
+        return self.counters
+
+# Per-interface restore progress in statedb "NEIGH_RESTORE_TABLE|<intf>"
+#   state:    "waiting" / "restoring" / "restored" / "timed_out"
+#   restored: number of entries restored
+#   total:    number of saved entries
+class RestoreProgress(object):
+    def __init__(self):
+        self.state_db = swsscommon.DBConnector("STATE_DB", 0)
+        self.table = swsscommon.Table(self.state_db, 'NEIGH_RESTORE_TABLE')
+        # intf -> [restored, total]
+        self.intfs = {}
+
+    def add_entries(self, intf, count):
+        self.intfs.setdefault(intf, [0, 0])[1] += count
+
+    def add_restored(self, intf, count):
+        self.intfs[intf][0] += count
+
+    def set_state(self, intf, state):
+        restored, total = self.intfs[intf]
+        self.table.set(intf, swsscommon.FieldValuePairs([
+            ('state', state), ('restored', str(restored)), ('total', str(total))]))
+
+    # percentage of the saved entries, or of the interfaces, fully restored
+    def percent(self, complete_on):
+        if complete_on == 'intfs':
+            done = sum(1 for restored, total in self.intfs.values() if restored == total)
+            total = len(self.intfs)
+        else:
+            done = sum(restored for restored, _ in self.intfs.values())
+            total = sum(total for _, total in self.intfs.values())
+        return 100.0 * done / total if total else 100.0
+
 # This function is to restore the kernel neighbors based on the saved neighbor map
-# It iterates through the map, and work on interface by interface basis.
-# If the interface is operational up and has IP configured per IP family,
-# it will restore the neighbors per family.
-# The restoring process is done by setting the neighbors in kernel from saved entries
-# first, then sending arp/nd packets to update the neighbors.
+# It works on interface by interface basis, every interface of the map is checked
+# once, then an interface is checked again when a link, address or vlan member
+# notification is received for it, and restored as soon as it is up
+# (see restore_intf_neighbors). Up to `workers` interfaces are restored concurrently,
+# so the total time follows the busiest interface rather than the sum of all of them.
+# The progress of every interface is published in statedb (see RestoreProgress).
 # Once all the entries are restored, this function is returned.
-# The interfaces' states were checked in a loop with an interval (CHECK_INTERVAL)
 # The function will timeout in case interfaces' states never meet the condition
 # after some time (DEF_TIME_OUT).
-def restore_update_kernel_neighbors(intf_neigh_map, timeout=DEF_TIME_OUT):
-    # create object for netlink calls to kernel
-    ipclass = IPRoute()
+# on_complete is called once, to signal neighsyncd it can start reconciliation:
+#  - when complete_percent of the entries (complete_on='entries') or of the interfaces
+#    (complete_on='intfs') are restored, the remaining ones keep being restored in the
+#    background until the timeout
+#  - at the latest after DEF_TIME_OUT, as neighsyncd does not wait much longer, or
+#    when the restore is finished
+# If neigh_records is given, the records are read in DB_READ_BATCH_SIZE batches and
+# added to the map while the interfaces already read are being restored.
+# ifindex_hints optionally maps interface names to their expected index.
+# kernel_neighs is the kernel neighbor table dumped for diff mode, or None.
+# Returns the completion report with the restore counters and phase timings, the
+# restored entries are removed from the map.
+def restore_update_kernel_neighbors(intf_neigh_map, timeout=DEF_TIME_OUT, nl_batch_size=DEF_NL_BATCH_SIZE,
+                                    probe_pps=DEF_PROBE_PPS, workers=DEF_WORKERS, neigh_records=None,
+                                    ifindex_hints=None, kernel_neighs=None, on_complete=None,
+                                    complete_percent=100, complete_on='entries'):
     start_time = time.monotonic()
-    is_intf_up.counter = 0
-    db = swsssdk.SonicV2Connector(host='127.0.0.1')
-    db.connect(db.STATE_DB, False)
-    while (time.monotonic() - start_time) < timeout:
-        for intf, family_neigh_map in list(intf_neigh_map.items()):
+    complete_time_out = min(timeout, DEF_TIME_OUT)
+    # subscribe before the first check, so no state change is missed
+    watcher = IntfStateWatcher()
+    pool = RestoreWorkers(workers, nl_batch_size, probe_pps, watcher.wakeup, ifindex_hints, kernel_neighs)
+    progress = RestoreProgress()
+    for intf, family_neigh_map in intf_neigh_map.items():
+        progress.add_entries(intf, sum(len(neigh_list) for neigh_list in family_neigh_map.values()))
+        progress.set_state(intf, 'waiting')
+    # intf -> future of the interfaces being restored
+    running = {}
+    # interfaces already seen up
+    up_intfs = set()
+    report = Counter()
+    completed = False
+
+    def complete():
+        log_info('Neighbor restore completion signalled after {:.3f} seconds, {:.1f}% {} restored'.format(
+                 time.monotonic() - start_time, progress.percent(complete_on), complete_on))
+        report['complete_time'] = time.monotonic() - start_time
+        if on_complete:
+            on_complete()
+
+    # merge the result of a finished interface, returns True if it is fully restored
+    def collect(intf):
+        restored, counters = running.pop(intf).result()
+        report.update(counters)
+        progress.add_restored(intf, sum(restored.values()))
+        family_neigh_map = intf_neigh_map[intf]
+        for family, count in restored.items():
+            del family_neigh_map[family][:count]
+            if not family_neigh_map[family]:
+                del family_neigh_map[family]
+        # if all families are deleted, remove the key
+        if len(intf_neigh_map[intf]) == 0:
+            del intf_neigh_map[intf]
+            progress.set_state(intf, 'restored')
+            return True
+        progress.set_state(intf, 'waiting')
+        return False
+
+    check_intfs = set(intf_neigh_map)
+    while True:
+        if neigh_records is not None:
+            phase_start = time.monotonic()
+            batch = list(islice(neigh_records, DB_READ_BATCH_SIZE))
+            report['db_read_time'] += time.monotonic() - phase_start
+            for record in batch:
+                if record[0] == 'lo':
+                    report['skipped'] += 1
+                    continue
+                add_neigh_to_map(intf_neigh_map, *record)
+                progress.add_entries(record[0], 1)
+                check_intfs.add(record[0])
+            if not batch:
+                neigh_records = None
+                for intf in intf_neigh_map:
+                    if intf not in running:
+                        progress.set_state(intf, 'waiting')
+                # entries read while their interface was being restored are left in the map
+                check_intfs.update(intf_neigh_map)
+        for intf in [intf for intf, future in running.items() if future.done()]:
+            # entries read while the interface was being restored are restored right away
+            # if their family has an ip, the families with no ip yet are checked again on
+            # the address notification or after CHECK_INTERVAL
+            if not collect(intf) and any(first_ip_on_intf(intf, family) for family in intf_neigh_map[intf]):
+                check_intfs.add(intf)
+        for intf in check_intfs:
             # only try to restore to kernel when link is up
-            if is_intf_up(intf, db):
-                src_mac = get_if_hwaddr(intf)
-                intf_idx = ipclass.link_lookup(ifname=intf)[0]
-                # create socket per intf to send packets
-                s = conf.L2socket(iface=intf)
-
-                # Only two families: 'IPv4' and 'IPv6'
-                for family in ip_family.keys():
-                    # if ip address assigned and if we have neighs in this family, restore them
-                    src_ip = first_ip_on_intf(intf, family)
-                    if src_ip and (family in family_neigh_map):
-                        neigh_list = family_neigh_map[family]
-                        for dst_ip, dmac in neigh_list:
-                            # use netlink to set neighbor entries
-                            set_neigh_in_kernel(ipclass, family, intf_idx, dst_ip, dmac)
-
-                            log_info('Sending Neigh with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-                            family, intf_idx, dst_ip, dmac))
-                            # sending arp/ns packet to update kernel neigh info
-                            s.send(build_arp_ns_pkt(family, src_mac, src_ip, dst_ip))
-                        # delete this family on the intf
-                        del intf_neigh_map[intf][family]
-                # close the pkt socket
-                s.close()
-
-                # if all families are deleted, remove the key
-                if len(intf_neigh_map[intf]) == 0:
-                    del intf_neigh_map[intf]
+            if intf in intf_neigh_map and intf not in running and watcher.is_intf_up(intf):
+                if intf not in up_intfs:
+                    # time waited for the interface to come up
+                    up_intfs.add(intf)
+                    wait_time = time.monotonic() - start_time
+                    if wait_time > report['wait_for_up_time']:
+                        report['wait_for_up_time'] = wait_time
+                        report['wait_for_up_intf'] = intf
+                # entries of a running interface may still be added by the table reader
+                running[intf] = pool.submit(intf, {family: list(neigh_list)
+                                                   for family, neigh_list in intf_neigh_map[intf].items()})
+                progress.set_state(intf, 'restoring')
         # map is empty, all neigh entries are restored
-        if not intf_neigh_map:
+        if not intf_neigh_map and neigh_records is None:
             break
-        time.sleep(CHECK_INTERVAL)
-    db.close(db.STATE_DB)
+        elapsed = time.monotonic() - start_time
+        if not completed and neigh_records is None:
+            if progress.percent(complete_on) >= complete_percent or elapsed >= complete_time_out:
+                complete()
+                completed = True
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            break
+        if neigh_records is not None:
+            # still reading the table, only pick up the notifications already received
+            changed = watcher.wait(0)
+        else:
+            if not completed:
+                remaining = min(remaining, complete_time_out - elapsed)
+            changed = watcher.wait(remaining)
+        check_intfs = set(intf_neigh_map) if changed is None else changed
+    report.update(pool.close())
+    for intf in list(running):
+        collect(intf)
+    for intf in intf_neigh_map:
+        progress.set_state(intf, 'timed_out')
+    if not completed:
+        complete()
+    watcher.close()
+    report['restored_intfs'] = len(progress.intfs) - len(intf_neigh_map)
+    report['pending_intfs'] = len(intf_neigh_map)
+    report['timed_out'] = sum(len(neigh_list) for family_neigh_map in intf_neigh_map.values()
+                              for neigh_list in family_neigh_map.values())
+    return report
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Restore the neighbor table into kernel during warm reboot')
+    parser.add_argument('--nl-batch-size', type=int, default=DEF_NL_BATCH_SIZE,
+                        help='number of neighbor entries sent per netlink socket write (default: %(default)s)')
+    parser.add_argument('--probe-pps', type=int, default=DEF_PROBE_PPS,
+                        help='arp/ns packets per second sent on each interface, 0 for no limit (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=DEF_WORKERS,
+                        help='number of interfaces restored concurrently (default: %(default)s)')
+    parser.add_argument('--plan-file', default=DEF_PLAN_FILE,
+                        help='neighbor restore plan file (default: %(default)s)')
+    parser.add_argument('--save-plan', action='store_true',
+                        help='save the restore plan from the AppDB neigh table and exit, run before warm reboot')
+    parser.add_argument('--timeout', type=int, default=DEF_TIME_OUT,
+                        help='seconds to keep restoring neighbors of interfaces not up yet (default: %(default)s)')
+    parser.add_argument('--complete-percent', type=float, default=100,
+                        help='signal neighsyncd once this percentage of the entries or interfaces is restored, '
+                             'the remaining ones are restored in the background (default: %(default)s)')
+    parser.add_argument('--complete-on', choices=['entries', 'intfs'], default='entries',
+                        help='what --complete-percent applies to (default: %(default)s)')
+    parser.add_argument('--diff', action='store_true',
+                        help='only program the neighbors missing or changed in the kernel neighbor table, '
+                             'also run on swss warm restart')
+    parser.add_argument('--log-level', choices=list(log_levels), default='info',
+                        help='syslog level, per neighbor entry messages are logged at debug level (default: %(default)s)')
+    args = parser.parse_args()
+    set_log_level(args.log_level)
+
+    if args.save_plan:
+        try:
+            count = RestorePlan.save(args.plan_file, read_neigh_table())
+        except Exception as e:
+            logger.exception(str(e))
+            sys.exit(1)
+        log_info('Neighbor restore plan saved to {} with {} entries'.format(args.plan_file, count))
+        return
 
     log_info ("restore_neighbors service is started")
     # Use warmstart python binding to check warmstart information
@@ -281,27 +1132,45 @@ def main():
         log_info ("restore_neighbors service is skipped as warm restart not enabled")
         return
 
-    # swss restart not system warm reboot, set statedb directly
-    if not warmstart.isSystemWarmRebootEnabled():
+    # swss restart not system warm reboot, the kernel neighbor table is kept, set statedb
+    # directly unless diff mode is asked to program the entries missing in the kernel,
+    # e.g. after a partial previous run
+    system_warm_reboot = warmstart.isSystemWarmRebootEnabled()
+    if not system_warm_reboot and not args.diff:
         set_statedb_neigh_restore_done()
         log_info ("restore_neighbors service is done as system warm reboot not enabled")
         return
-    # read the neigh table from appDB to internal map
-    try:
-        intf_neigh_map = read_neigh_table_to_maps()
-    except RuntimeError as e:
-        logger.exception(str(e))
-        sys.exit(1)
-
+    start_time = time.monotonic()
+    # the neigh table is read from the restore plan saved before reboot, or streamed
+    # from appDB, to the internal map while restoring
+    plan = RestorePlan.load(args.plan_file)
+    if plan:
+        log_info('Neighbor restore plan {} loaded with {} entries'.format(args.plan_file, plan.n_entries))
+        neigh_records = plan.records()
+        ifindex_hints = plan.ifindex_hints
+    else:
+        neigh_records = read_neigh_table()
+        ifindex_hints = None
+    intf_neigh_map = {}
     try:
-        restore_update_kernel_neighbors(intf_neigh_map)
+        kernel_neighs = dump_kernel_neighbors() if args.diff else None
+        # set statedb to signal other processes like neighsyncd, once the completion
+        # policy is met
+        report = restore_update_kernel_neighbors(intf_neigh_map, timeout=args.timeout,
+                                                 nl_batch_size=args.nl_batch_size,
+                                                 probe_pps=args.probe_pps, workers=args.workers,
+                                                 neigh_records=neigh_records, ifindex_hints=ifindex_hints,
+                                                 kernel_neighs=kernel_neighs,
+                                                 on_complete=set_statedb_neigh_restore_done,
+                                                 complete_percent=args.complete_percent,
+                                                 complete_on=args.complete_on)
     except Exception as e:
         logger.exception(str(e))
         sys.exit(1)
 
-    # set statedb to signal other processes like neighsyncd
-    set_statedb_neigh_restore_done()
-    log_info ("restore_neighbor service is done for system warmreboot")
+    set_statedb_neigh_restore_stats(report, time.monotonic() - start_time)
+    log_info ("restore_neighbor service is done for {}".format(
+              "system warmreboot" if system_warm_reboot else "swss warm restart"))
     return
 
 if __name__ == '__main__':
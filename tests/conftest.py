@@ -2,7 +2,6 @@ import os
 import re
 import time
 import json
-import redis
 import docker
 import pytest
 import random
@@ -12,12 +11,14 @@ import sys
 import tarfile
 import io
 
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Dict, Tuple
 from datetime import datetime
 
 from swsscommon import swsscommon
+from dvslib.dvs_connections import DVSConnectionPool
 from dvslib.dvs_database import DVSDatabase
 from dvslib.dvs_common import PollingConfig, wait_for_result
+from dvslib.dvs_telemetry import WaitTelemetry
 from dvslib.dvs_acl import DVSAcl
 from dvslib.dvs_pbh import DVSPbh
 from dvslib.dvs_route import DVSRoute
@@ -28,6 +29,9 @@ from dvslib import dvs_policer
 
 from buffer_model import enable_dynamic_buffer
 
+if TYPE_CHECKING:
+    from dvslib.dvs_database_async import AsyncDVSDatabase
+
 # FIXME: For the sake of stabilizing the PR pipeline we currently assume there are 32 front-panel
 # ports in the system (much like the rest of the test suite). This should be adjusted to accomodate
 # a dynamic number of ports. GitHub Issue: Azure/sonic-swss#1384.
@@ -90,14 +94,68 @@ def pytest_addoption(parser):
                      default="traditional",
                      help="Buffer model")
 
+    parser.addoption("--wait-telemetry",
+                     action="store_true",
+                     default=False,
+                     help="Report the slowest waits and the time spent in time.sleep() at the end of the run")
+
+    parser.addoption("--wait-telemetry-top",
+                     action="store",
+                     default=20,
+                     type=int,
+                     help="Number of waits and time.sleep() callers to report with --wait-telemetry. (default = 20)")
+
+    parser.addoption("--wait-telemetry-json",
+                     action="store",
+                     default=None,
+                     help="Write all the waits and time.sleep() calls to this JSON file, implies --wait-telemetry")
+
+
+def pytest_configure(config):
+    if config.getoption("--wait-telemetry") or config.getoption("--wait-telemetry-json"):
+        config.wait_telemetry = WaitTelemetry()
+        config.wait_telemetry.start()
+
+
+def pytest_unconfigure(config):
+    if getattr(config, "wait_telemetry", None):
+        config.wait_telemetry.stop()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    wait_telemetry = getattr(item.config, "wait_telemetry", None)
+    if wait_telemetry:
+        wait_telemetry.current_test = item.nodeid
+
+    yield
+
+    if wait_telemetry:
+        wait_telemetry.current_test = None
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    wait_telemetry = getattr(config, "wait_telemetry", None)
+    if not wait_telemetry:
+        return
+
+    terminalreporter.section("wait telemetry")
+    for line in wait_telemetry.summary(config.getoption("--wait-telemetry-top")):
+        terminalreporter.write_line(line)
+
+    json_path = config.getoption("--wait-telemetry-json")
+    if json_path:
+        wait_telemetry.dump(json_path)
+        terminalreporter.write_line(f"Wait telemetry written to {json_path}")
+
 
 def random_string(size=4, chars=string.ascii_uppercase + string.digits):
     return "".join(random.choice(chars) for x in range(size))
 
 
 class AsicDbValidator(DVSDatabase):
-    def __init__(self, db_id: int, connector: str):
-        DVSDatabase.__init__(self, db_id, connector)
+    def __init__(self, db_id: int, connector: str, connections: DVSConnectionPool = None):
+        DVSDatabase.__init__(self, db_id, connector, connections=connections)
         self._wait_for_asic_db_to_initialize()
         self._populate_default_asic_db_values()
         self._generate_oid_to_interface_mapping()
@@ -128,9 +186,8 @@ class AsicDbValidator(DVSDatabase):
         self.hostifoidmap = {}
         self.hostifnamemap = {}
 
-        host_intfs = self.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_HOSTIF")
-        for intf in host_intfs:
-            fvs = self.get_entry("ASIC_STATE:SAI_OBJECT_TYPE_HOSTIF", intf)
+        host_intfs = self.get_table("ASIC_STATE:SAI_OBJECT_TYPE_HOSTIF")
+        for intf, fvs in host_intfs.items():
             port_oid = fvs.get("SAI_HOSTIF_ATTR_OBJ_ID")
             port_name = fvs.get("SAI_HOSTIF_ATTR_NAME")
 
@@ -152,8 +209,8 @@ class AsicDbValidator(DVSDatabase):
 class ApplDbValidator(DVSDatabase):
     NEIGH_TABLE = "NEIGH_TABLE"
 
-    def __init__(self, db_id: int, connector: str):
-        DVSDatabase.__init__(self, db_id, connector)
+    def __init__(self, db_id: int, connector: str, connections: DVSConnectionPool = None):
+        DVSDatabase.__init__(self, db_id, connector, connections=connections)
 
     def __del__(self):
         # Make sure no neighbors on physical interfaces
@@ -380,6 +437,7 @@ class DockerVirtualSwitch:
         self.pid = int(output)
         self.redis_sock = os.path.join(self.mount, "redis.sock")
         self.redis_chassis_sock = os.path.join(self.mount, "redis_chassis.sock")
+        self.connections = DVSConnectionPool(self.redis_sock)
 
         self.reset_dbs()
 
@@ -403,6 +461,7 @@ class DockerVirtualSwitch:
         self.config_db = None
         self.flex_db = None
         self.state_db = None
+        self.async_dbs = {}
 
     def destroy(self) -> None:
         if getattr(self, 'appldb', False):
@@ -435,7 +494,8 @@ class DockerVirtualSwitch:
             # Verify that all of the device services have started.
             self.check_services_ready()
 
-            # Initialize the databases.
+            # Initialize the databases, the connections opened before a restart are stale.
+            self.connections.reset()
             self.init_asic_db_validator()
             self.init_appl_db_validator()
             self.reset_dbs()
@@ -474,10 +534,10 @@ class DockerVirtualSwitch:
         wait_for_result(_polling_function, service_polling_config)
 
     def init_asic_db_validator(self) -> None:
-        self.asicdb = AsicDbValidator(self.ASIC_DB_ID, self.redis_sock)
+        self.asicdb = AsicDbValidator(self.ASIC_DB_ID, self.redis_sock, self.connections)
 
     def init_appl_db_validator(self) -> None:
-        self.appldb = ApplDbValidator(self.APPL_DB_ID, self.redis_sock)
+        self.appldb = ApplDbValidator(self.APPL_DB_ID, self.redis_sock, self.connections)
 
     def check_swss_ready(self, timeout: int = 300) -> None:
         """Verify that SWSS is ready to receive inputs.
@@ -678,16 +738,14 @@ class DockerVirtualSwitch:
 
     # deps: warm_reboot
     def SubscribeAppDbObject(self, objpfx):
-        r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.APPL_DB,
-                        encoding="utf-8", decode_responses=True)
+        r = self.connections.get_redis_client(swsscommon.APPL_DB)
         pubsub = r.pubsub()
         pubsub.psubscribe("__keyspace@0__:%s*" % objpfx)
         return pubsub
 
     # deps: warm_reboot
     def SubscribeAsicDbObject(self, objpfx):
-        r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.ASIC_DB,
-                        encoding="utf-8", decode_responses=True)
+        r = self.connections.get_redis_client(swsscommon.ASIC_DB)
         pubsub = r.pubsub()
         pubsub.psubscribe("__keyspace@1__:ASIC_STATE:%s*" % objpfx)
         return pubsub
@@ -718,8 +776,7 @@ class DockerVirtualSwitch:
 
     # deps: warm_reboot
     def GetSubscribedAppDbObjects(self, pubsub, ignore=None, timeout=10):
-        r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.APPL_DB,
-                        encoding="utf-8", decode_responses=True)
+        r = self.connections.get_redis_client(swsscommon.APPL_DB)
 
         addobjs = []
         delobjs = []
@@ -762,8 +819,7 @@ class DockerVirtualSwitch:
 
     # deps: warm_reboot
     def GetSubscribedAsicDbObjects(self, pubsub, ignore=None, timeout=10):
-        r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.ASIC_DB,
-                        encoding="utf-8", decode_responses=True)
+        r = self.connections.get_redis_client(swsscommon.ASIC_DB)
 
         addobjs = []
         delobjs = []
@@ -795,8 +851,7 @@ class DockerVirtualSwitch:
     # deps: warm_reboot
     def SubscribeDbObjects(self, dbobjs):
         # assuming all the db object pairs are in the same db instance
-        r = redis.Redis(unix_socket_path=self.redis_sock, encoding="utf-8",
-                        decode_responses=True)
+        r = self.connections.get_redis_client(0)
         pubsub = r.pubsub()
         substr = ""
         for db, obj in dbobjs:
@@ -1118,10 +1173,10 @@ class DockerVirtualSwitch:
     # deps: acl, fdb_update, fdb, intf_mac, mirror_port_erspan, mirror_port_span,
     # policer, port_dpb_vlan, vlan
     def setup_db(self):
-        self.pdb = swsscommon.DBConnector(0, self.redis_sock, 0)
-        self.adb = swsscommon.DBConnector(1, self.redis_sock, 0)
-        self.cdb = swsscommon.DBConnector(4, self.redis_sock, 0)
-        self.sdb = swsscommon.DBConnector(6, self.redis_sock, 0)
+        self.pdb = self.connections.get_connector(0)
+        self.adb = self.connections.get_connector(1)
+        self.cdb = self.connections.get_connector(4)
+        self.sdb = self.connections.get_connector(6)
 
     def getSwitchOid(self):
         tbl = swsscommon.Table(self.adb, "ASIC_STATE:SAI_OBJECT_TYPE_SWITCH")
@@ -1143,7 +1198,7 @@ class DockerVirtualSwitch:
 
     # deps: acl_portchannel, fdb
     def getCrmCounterValue(self, key, counter):
-        counters_db = swsscommon.DBConnector(swsscommon.COUNTERS_DB, self.redis_sock, 0)
+        counters_db = self.connections.get_connector(swsscommon.COUNTERS_DB)
         crm_stats_table = swsscommon.Table(counters_db, 'CRM')
 
         for k in crm_stats_table.get(key)[1]:
@@ -1152,15 +1207,14 @@ class DockerVirtualSwitch:
 
     # deps: acl, crm, fdb
     def setReadOnlyAttr(self, obj, attr, val):
-        db = swsscommon.DBConnector(swsscommon.ASIC_DB, self.redis_sock, 0)
+        db = self.connections.get_connector(swsscommon.ASIC_DB)
         tbl = swsscommon.Table(db, "ASIC_STATE:{0}".format(obj))
         keys = tbl.getKeys()
 
         assert len(keys) == 1
 
         swVid = keys[0]
-        r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.ASIC_DB,
-                        encoding="utf-8", decode_responses=True)
+        r = self.connections.get_redis_client(swsscommon.ASIC_DB)
         swRid = r.hget("VIDTORID", swVid)
 
         assert swRid is not None
@@ -1178,7 +1232,7 @@ class DockerVirtualSwitch:
     # that implementation. Save it for a follow-up PR.
     def get_app_db(self) -> ApplDbValidator:
         if not self.app_db:
-            self.app_db = DVSDatabase(self.APPL_DB_ID, self.redis_sock)
+            self.app_db = DVSDatabase(self.APPL_DB_ID, self.redis_sock, connections=self.connections)
 
         return self.app_db
 
@@ -1186,7 +1240,7 @@ class DockerVirtualSwitch:
     # that implementation. Save it for a follow-up PR.
     def get_asic_db(self) -> AsicDbValidator:
         if not self.asic_db:
-            db = DVSDatabase(self.ASIC_DB_ID, self.redis_sock)
+            db = DVSDatabase(self.ASIC_DB_ID, self.redis_sock, connections=self.connections)
             db.default_acl_tables = self.asicdb.default_acl_tables
             db.default_acl_entries = self.asicdb.default_acl_entries
             db.default_copp_policers = self.asicdb.default_copp_policers
@@ -1200,28 +1254,37 @@ class DockerVirtualSwitch:
 
     def get_counters_db(self) -> DVSDatabase:
         if not self.counters_db:
-            self.counters_db = DVSDatabase(self.COUNTERS_DB_ID, self.redis_sock)
+            self.counters_db = DVSDatabase(self.COUNTERS_DB_ID, self.redis_sock, connections=self.connections)
 
         return self.counters_db
 
     def get_config_db(self) -> DVSDatabase:
         if not self.config_db:
-            self.config_db = DVSDatabase(self.CONFIG_DB_ID, self.redis_sock)
+            self.config_db = DVSDatabase(self.CONFIG_DB_ID, self.redis_sock, connections=self.connections)
 
         return self.config_db
 
     def get_flex_db(self) -> DVSDatabase:
         if not self.flex_db:
-            self.flex_db = DVSDatabase(self.FLEX_COUNTER_DB_ID, self.redis_sock)
+            self.flex_db = DVSDatabase(self.FLEX_COUNTER_DB_ID, self.redis_sock, connections=self.connections)
 
         return self.flex_db
 
     def get_state_db(self) -> DVSDatabase:
         if not self.state_db:
-            self.state_db = DVSDatabase(self.STATE_DB_ID, self.redis_sock)
+            self.state_db = DVSDatabase(self.STATE_DB_ID, self.redis_sock, connections=self.connections)
 
         return self.state_db
 
+    def get_async_db(self, db_id: int) -> "AsyncDVSDatabase":
+        # Imported here so that the sync-only tests do not need redis.asyncio
+        from dvslib.dvs_database_async import AsyncDVSDatabase
+
+        if db_id not in self.async_dbs:
+            self.async_dbs[db_id] = AsyncDVSDatabase(db_id, self.redis_sock, connections=self.connections)
+
+        return self.async_dbs[db_id]
+
     def change_port_breakout_mode(self, intf_name, target_mode, options=""):
         cmd = f"config interface breakout {intf_name} {target_mode} -y {options}"
         self.runcmd(cmd)
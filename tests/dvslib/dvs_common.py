@@ -1,9 +1,14 @@
 """Common infrastructure for writing VS tests."""
 
+import asyncio
+import os
+import random
+import re
+import sys
 import time
 
 from dataclasses import dataclass
-from typing import Any, Callable, Tuple
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
 
 
 @dataclass
@@ -11,27 +16,179 @@ class PollingConfig:
     """Class containing parameters that are used to control polling behavior.
 
     Attributes:
-        polling_interval: How often to poll, in seconds.
+        polling_interval: How often to poll, in seconds. If set to 0, the polling function is
+            only run once.
         timeout: The maximum amount of time to wait, in seconds.
         strict: If the strict flag is set, reaching the timeout will cause tests to fail.
+        backoff: The polling interval is multiplied by this factor after every attempt.
+        max_polling_interval: The maximum polling interval when backing off, in seconds. If not
+            set, the interval is not limited.
+        jitter: The polling interval is randomly changed by up to this fraction of its value, so
+            that concurrent pollers do not synchronize.
     """
 
     polling_interval: float = 0.01
     timeout: float = 5.00
     strict: bool = True
+    backoff: float = 1.0
+    max_polling_interval: Optional[float] = None
+    jitter: float = 0.0
 
     def iterations(self) -> int:
-        """Return the number of iterations needed to poll with the given interval and timeout."""
+        """Return the number of iterations needed to poll with the given interval and timeout.
+
+        This does not take backoff or the time taken by the polling function into account.
+        """
         return 1 if self.polling_interval == 0 else int(self.timeout // self.polling_interval) + 1
 
+    def intervals(self):
+        """Generate the successive polling intervals, in seconds."""
+        interval = self.polling_interval
+        while True:
+            if self.jitter:
+                yield interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            else:
+                yield interval
+
+            interval *= self.backoff
+            if self.max_polling_interval is not None:
+                interval = min(interval, self.max_polling_interval)
+
+
+@dataclass
+class PollingStats:
+    """Statistics of a call to `wait_for_result`.
+
+    Attributes:
+        iterations: The number of times the polling function was run.
+        elapsed: The time until the polling function succeeded or timed out, in seconds.
+        success: Whether the polling function succeeded.
+        timeout: The timeout of the call, in seconds.
+        caller: The location of the call, outside of dvslib, as "file:line (function)".
+        table: The name of the table being polled, if any.
+    """
+
+    iterations: int
+    elapsed: float
+    success: bool
+    timeout: float
+    caller: str = ""
+    table: Optional[str] = None
+
+
+_polling_stats_listeners: List[Callable[[PollingStats], None]] = []
+
+DVSLIB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The frames of the event loop are skipped as well, so that the caller of a wait running in a
+# task is the one which ran the event loop.
+_SKIPPED_CALLER_DIRS = (DVSLIB_DIR, os.path.dirname(os.path.abspath(asyncio.__file__)))
+
+
+def find_caller(depth: int = 1) -> str:
+    """Get the location of the first caller outside of dvslib and asyncio.
+
+    Args:
+        depth: The number of frames to skip, 1 being the caller of this function.
+
+    Returns:
+        The location of the caller, as "file:line (function)".
+    """
+    frame = sys._getframe(depth)  # pylint: disable=protected-access
+    while frame.f_back and frame.f_code.co_filename.startswith(_SKIPPED_CALLER_DIRS):
+        frame = frame.f_back
+
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+
+
+def add_polling_stats_listener(listener: Callable[[PollingStats], None]) -> None:
+    """Call `listener` with the statistics of every subsequent call to `wait_for_result`."""
+    _polling_stats_listeners.append(listener)
+
+
+def remove_polling_stats_listener(listener: Callable[[PollingStats], None]) -> None:
+    """Stop calling `listener` with the statistics of the calls to `wait_for_result`."""
+    _polling_stats_listeners.remove(listener)
+
+
+class PollingStatsRecorder:
+    """PollingStatsRecorder records the statistics of the calls to `wait_for_result`.
+
+    Example:
+        with PollingStatsRecorder() as recorder:
+            dvs.get_asic_db().wait_for_n_keys(...)
+        print(recorder.stats)
+    """
+
+    def __init__(self):
+        """Initialize a PollingStatsRecorder instance."""
+        self.stats: List[PollingStats] = []
+
+    def __enter__(self) -> "PollingStatsRecorder":
+        add_polling_stats_listener(self.stats.append)
+        return self
+
+    def __exit__(self, *args) -> None:
+        remove_polling_stats_listener(self.stats.append)
+
+
+class _PollingLoop:
+    """The timing, statistics and outcome of the polling loops of `wait_for_result` and
+    `wait_for_result_async`."""
+
+    def __init__(self, polling_config: PollingConfig, table_name: Optional[str]):
+        self.polling_config = polling_config
+        self.table_name = table_name
+        self.start = time.monotonic()
+        self.deadline = self.start + polling_config.timeout
+        self.intervals = polling_config.intervals()
+        self.iterations = 0
+
+    def next_wait(self, status: bool) -> Optional[float]:
+        """Count an attempt and get the time left until the deadline, or None if polling is over."""
+        self.iterations += 1
+        if status or self.polling_config.polling_interval == 0:
+            return None
+
+        remaining = self.deadline - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def next_interval(self, remaining: float) -> float:
+        """Get the time to sleep before the next attempt, in seconds."""
+        return min(next(self.intervals), remaining)
+
+    def finish(self, status: bool, result: Any, failure_message: Optional[str]) -> Tuple[bool, Any]:
+        """Report the statistics of the loop and get its outcome."""
+        if _polling_stats_listeners:
+            stats = PollingStats(self.iterations, time.monotonic() - self.start, bool(status),
+                                 self.polling_config.timeout, find_caller(), self.table_name)
+            for listener in _polling_stats_listeners:
+                listener(stats)
+
+        if status:
+            return (True, result)
+
+        if self.polling_config.strict:
+            message = failure_message or (
+                f"Operation timed out after {self.polling_config.timeout} seconds with result {result}"
+            )
+            assert False, message
+
+        return (False, result)
+
 
 def wait_for_result(
     polling_function: Callable[[], Tuple[bool, Any]],
     polling_config: PollingConfig = PollingConfig(),
     failure_message: str = None,
+    wait_for_change: Optional[Callable[[float], None]] = None,
+    table_name: Optional[str] = None,
 ) -> Tuple[bool, Any]:
     """Run `polling_function` periodically using the specified `polling_config`.
 
+    The timeout is a deadline: the time taken by the polling function counts towards it, and the
+    polling function is run one last time when it is reached.
+
     Args:
         polling_function: The function being polled. The function cannot take any arguments and
             must return a status which indicates if the function was succesful or not, as well as
@@ -39,6 +196,11 @@ def wait_for_result(
         polling_config: The parameters to use to poll the polling function.
         failure_message: The message to print if the call times out. This will only take effect
             if the PollingConfig is set to strict.
+        wait_for_change: If provided, `polling_function` is only run again once this function
+            returns, instead of every `polling_interval`. It is called with the maximum time to
+            wait, in seconds, and should return early when the polled data may have changed.
+        table_name: The name of the table being polled, if any, recorded in the polling
+            statistics.
 
     Returns:
         If the polling function succeeds, then this method will return True and the output of the
@@ -47,16 +209,50 @@ def wait_for_result(
         If it does not succeed within the provided timeout, it will return False and whatever the
         output of the polling function was on the final attempt.
     """
-    for _ in range(polling_config.iterations()):
+    loop = _PollingLoop(polling_config, table_name)
+
+    while True:
         status, result = polling_function()
+        remaining = loop.next_wait(status)
+        if remaining is None:
+            break
 
-        if status:
-            return (True, result)
+        if wait_for_change:
+            wait_for_change(remaining)
+        else:
+            time.sleep(loop.next_interval(remaining))
+
+    return loop.finish(status, result, failure_message)
+
+
+async def wait_for_result_async(
+    polling_function: Callable[[], Awaitable[Tuple[bool, Any]]],
+    polling_config: PollingConfig = PollingConfig(),
+    failure_message: str = None,
+    wait_for_change: Optional[Callable[[float], Awaitable[None]]] = None,
+    table_name: Optional[str] = None,
+) -> Tuple[bool, Any]:
+    """Await `polling_function` periodically using the specified `polling_config`.
+
+    This is the asyncio version of `wait_for_result`: `polling_function` and `wait_for_change`
+    are coroutine functions, and the event loop runs other tasks between the attempts.
+    """
+    loop = _PollingLoop(polling_config, table_name)
+
+    while True:
+        status, result = await polling_function()
+        remaining = loop.next_wait(status)
+        if remaining is None:
+            break
+
+        if wait_for_change:
+            await wait_for_change(remaining)
+        else:
+            await asyncio.sleep(loop.next_interval(remaining))
 
-        time.sleep(polling_config.polling_interval)
+    return loop.finish(status, result, failure_message)
 
-    if polling_config.strict:
-        message = failure_message or f"Operation timed out after {polling_config.timeout} seconds with result {result}"
-        assert False, message
 
-    return (False, result)
+def escape_glob(key: str) -> str:
+    """Escape the glob-style special characters of a redis key, e.g. for a KEYS or SCAN pattern."""
+    return re.sub(r"([\\*?\[\]])", r"\\\1", key)
@@ -0,0 +1,99 @@
+"""Shared connections to the redis databases of a virtual switch.
+
+Opening a swsscommon DBConnector or a redis client for every helper object churns connections on
+the redis unix socket, e.g. when the DPB tests create hundreds of Port objects. DVSConnectionPool
+opens them once per database and hands out the same instances to all of its users.
+"""
+from dataclasses import dataclass
+from typing import Dict
+
+import redis
+from swsscommon import swsscommon
+
+
+@dataclass
+class ConnectionStats:
+    """Statistics of the connections handed out by a DVSConnectionPool.
+
+    Attributes:
+        connectors: The number of open swsscommon DBConnectors.
+        redis_clients: The number of open redis clients.
+        opened: The number of connectors and redis clients opened since the pool was created.
+        reused: The number of times an already open connector or redis client was handed out.
+    """
+
+    connectors: int
+    redis_clients: int
+    opened: int
+    reused: int
+
+
+class DVSConnectionPool:
+    """DVSConnectionPool hands out shared connections to the redis databases of a virtual switch.
+
+    A single DBConnector and a single redis client are opened per database. The connections are
+    no longer valid once redis is restarted, `reset` must then be called so that new ones are
+    opened.
+    """
+
+    def __init__(self, redis_sock: str):
+        """Initialize a DVSConnectionPool instance.
+
+        Args:
+            redis_sock: The UNIX socket used to communicate with redis.
+        """
+        self.redis_sock = redis_sock
+        self._connectors: Dict[int, swsscommon.DBConnector] = {}
+        self._redis_clients: Dict[int, redis.Redis] = {}
+        self._opened = 0
+        self._reused = 0
+
+    def get_connector(self, db_id: int) -> swsscommon.DBConnector:
+        """Get the DBConnector of the specified database.
+
+        Args:
+            db_id: The integer ID of the database in redis.
+
+        Returns:
+            The connector, shared with the other users of the pool.
+        """
+        if db_id in self._connectors:
+            self._reused += 1
+        else:
+            self._connectors[db_id] = swsscommon.DBConnector(db_id, self.redis_sock, 0)
+            self._opened += 1
+
+        return self._connectors[db_id]
+
+    def get_redis_client(self, db_id: int) -> redis.Redis:
+        """Get the redis client of the specified database.
+
+        The client decodes the responses as UTF-8 strings.
+
+        Args:
+            db_id: The integer ID of the database in redis.
+
+        Returns:
+            The redis client, shared with the other users of the pool.
+        """
+        if db_id in self._redis_clients:
+            self._reused += 1
+        else:
+            self._redis_clients[db_id] = redis.Redis(unix_socket_path=self.redis_sock, db=db_id,
+                                                     encoding="utf-8", decode_responses=True)
+            self._opened += 1
+
+        return self._redis_clients[db_id]
+
+    def get_stats(self) -> ConnectionStats:
+        """Get the statistics of the connections handed out by the pool."""
+        return ConnectionStats(len(self._connectors), len(self._redis_clients),
+                               self._opened, self._reused)
+
+    def reset(self) -> None:
+        """Close all the connections, new ones are opened when they are next requested."""
+        for client in self._redis_clients.values():
+            client.close()
+
+        self._connectors.clear()
+        self._redis_clients.clear()
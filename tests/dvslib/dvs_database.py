@@ -4,23 +4,367 @@ FIXME:
     - Reference DBs by name rather than ID/socket
     - Add support for ProducerStateTable
 """
-from typing import Dict, List
+import dataclasses
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+import redis
 from swsscommon import swsscommon
-from dvslib.dvs_common import wait_for_result, PollingConfig
+from dvslib.dvs_common import escape_glob, wait_for_result, PollingConfig
+from dvslib.dvs_connections import DVSConnectionPool
+from dvslib.dvs_sai_key import SAI_KEY_INDEXES
+
+
+class KeyspaceChannels:
+    """KeyspaceChannels holds the keyspace notification channels of a set of redis keys.
+
+    It is shared by KeyspaceWatcher and its asyncio version, which only differ by how they read
+    the notifications.
+    """
+
+    # The polled data is checked again after this many seconds even if no notification was
+    # received, in case one was lost.
+    FALLBACK_INTERVAL = 1.0
+
+    def __init__(self, db_id: int, key_patterns: List[str]):
+        """Initialize a KeyspaceChannels instance.
+
+        Args:
+            db_id: The integer ID of the database in redis.
+            key_patterns: The glob-style patterns of the watched keys.
+        """
+        self.channel_prefix = f"__keyspace@{db_id}__:"
+        self.channel_patterns = [self.channel_prefix + pattern for pattern in key_patterns]
+        self.changed_keys = set()
+
+    def _record(self, message) -> None:
+        if message["type"] == "pmessage":
+            self.changed_keys.add(message["channel"][len(self.channel_prefix):])
+
+
+class KeyspaceWatcher(KeyspaceChannels):
+    """KeyspaceWatcher waits for keyspace notifications of a set of redis keys.
+
+    The keys that were notified are recorded until they are retrieved with `get_changed_keys`.
+    """
+
+    def __init__(self, client: redis.Redis, db_id: int, key_patterns: List[str]):
+        """Subscribe to the keyspace notifications of the keys matching `key_patterns`.
+
+        Args:
+            client: The redis client of the database.
+            db_id: The integer ID of the database in redis.
+            key_patterns: The glob-style patterns of the watched keys.
+        """
+        KeyspaceChannels.__init__(self, db_id, key_patterns)
+        self.pubsub = client.pubsub()
+        self.pubsub.psubscribe(*self.channel_patterns)
+
+        # Make sure the subscription is active before the data is first checked, so that no
+        # change can be missed.
+        for _ in self.channel_patterns:
+            self.pubsub.get_message(timeout=self.FALLBACK_INTERVAL)
+
+    def wait(self, timeout: float) -> None:
+        """Wait for a notification of a watched key.
+
+        Args:
+            timeout: The maximum amount of time to wait, in seconds.
+        """
+        message = self.pubsub.get_message(timeout=min(timeout, self.FALLBACK_INTERVAL))
+
+        # Several notifications are usually received for a single update, they are all
+        # handled by the next check.
+        while message:
+            self._record(message)
+            message = self.pubsub.get_message()
+
+    def get_changed_keys(self) -> Set[str]:
+        """Get the keys notified since the last call, and stop recording them.
+
+        Returns:
+            The redis keys which were notified.
+        """
+        message = self.pubsub.get_message()
+        while message:
+            self._record(message)
+            message = self.pubsub.get_message()
+
+        changed_keys = self.changed_keys
+        self.changed_keys = set()
+        return changed_keys
+
+    def close(self) -> None:
+        """Unsubscribe from the keyspace notifications."""
+        self.pubsub.close()
+
+
+# The entries of a set of tables, mapped by table name and then by key.
+Snapshot = Dict[str, Dict[str, Dict[str, str]]]
+
+
+@dataclasses.dataclass
+class SnapshotDiff:
+    """The differences between two snapshots of a database.
+
+    A SnapshotDiff is falsy if the snapshots are identical, so `assert not diff` checks that
+    nothing changed.
+
+    Attributes:
+        added: The entries only in the second snapshot, mapped by table name and then by key.
+        removed: The entries only in the first snapshot, mapped by table name and then by key.
+        changed: The fields which differ between the entries in both snapshots, mapped by table
+            name and then by key, as (first value, second value). The value of a missing field
+            is None.
+    """
+
+    added: Snapshot = dataclasses.field(default_factory=dict)
+    removed: Snapshot = dataclasses.field(default_factory=dict)
+    changed: Dict[str, Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]]] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+@dataclasses.dataclass
+class WaitCheck:
+    """A condition on a table, waited for by the wait_for_* methods of the database clients.
+
+    The conditions and failure messages of the waits are defined here once, the clients of the
+    database only read the data and wait.
+
+    Attributes:
+        table_name: The name of the table being checked.
+        condition: Whether the data read from the table satisfies the check.
+        failure_message: The message of the failure, from the last data read, if the check is
+            never satisfied.
+        key: If set, the data read is the entry stored at this key.
+        keys: If set, the data read are the entries stored at these keys, mapped by key. If
+            neither `key` nor `keys` is set, the data read are the keys of the table.
+        result: The value returned by the wait, from the last data read.
+    """
+
+    table_name: str
+    condition: Callable[[Any], bool]
+    failure_message: Callable[[Any], str]
+    key: Optional[str] = None
+    keys: Optional[List[str]] = None
+    result: Callable[[Any], Any] = lambda data: data
+
+    def outcome(
+        self,
+        status: bool,
+        data: Any,
+        polling_config: PollingConfig,
+        failure_message: Optional[str] = None,
+    ) -> Any:
+        """Get the result of a wait from the last data read.
+
+        The wait fails if the check was not satisfied and `polling_config` is strict.
+        """
+        if not status:
+            assert not polling_config.strict, failure_message or self.failure_message(data)
+
+        return self.result(data)
+
+    @classmethod
+    def entry(cls, table_name: str, key: str) -> "WaitCheck":
+        """Check that the entry stored at `key` exists."""
+        return cls(
+            table_name,
+            bool,
+            lambda result: f'Entry not found: key="{key}", table="{table_name}"',
+            key=key,
+        )
+
+    @classmethod
+    def fields(cls, table_name: str, key: str, expected_fields: List[str]) -> "WaitCheck":
+        """Check that the entry stored at `key` has the specified fields."""
+        return cls(
+            table_name,
+            lambda result: all(field in result for field in expected_fields),
+            lambda result: (
+                f"Expected fields not found: expected={expected_fields}, received={result}, "
+                f'key="{key}", table="{table_name}"'
+            ),
+            key=key,
+        )
+
+    @classmethod
+    def field_match(cls, table_name: str, key: str, expected_fields: Dict[str, str]) -> "WaitCheck":
+        """Check that the entry stored at `key` has the specified field/values."""
+        return cls(
+            table_name,
+            lambda result: all(result.get(k) == v for k, v in expected_fields.items()),
+            lambda result: (
+                f"Expected field/value pairs not found: expected={expected_fields}, "
+                f'received={result}, key="{key}", table="{table_name}"'
+            ),
+            key=key,
+        )
+
+    @classmethod
+    def field_negative_match(cls, table_name: str, key: str, old_fields: Dict[str, str]) -> "WaitCheck":
+        """Check that the entry stored at `key` has different field/values than `old_fields`."""
+        return cls(
+            table_name,
+            lambda result: all(k in result and result[k] != v for k, v in old_fields.items()),
+            lambda result: (
+                f"Did not expect field/values to match, but they did: provided={old_fields}, "
+                f'received={result}, key="{key}", table="{table_name}"'
+            ),
+            key=key,
+        )
+
+    @classmethod
+    def exact_match(cls, table_name: str, key: str, expected_entry: Dict[str, str]) -> "WaitCheck":
+        """Check that the entry stored at `key` is `expected_entry`."""
+        return cls(
+            table_name,
+            lambda result: result == expected_entry,
+            lambda result: (
+                f"Exact match not found: expected={expected_entry}, received={result}, "
+                f'key="{key}", table="{table_name}"'
+            ),
+            key=key,
+        )
+
+    @classmethod
+    def deleted_entry(cls, table_name: str, key: str) -> "WaitCheck":
+        """Check that no entry is stored at `key`."""
+        return cls(
+            table_name,
+            lambda result: not result,
+            lambda result: f'Entry still exists: entry={result}, key="{key}", table="{table_name}"',
+            key=key,
+        )
+
+    @classmethod
+    def entries(cls, table_name: str, keys: List[str]) -> "WaitCheck":
+        """Check that the entries stored at `keys` exist."""
+        keys = list(dict.fromkeys(keys))
+
+        def missing_keys(result):
+            return [key for key in keys if key not in result]
+
+        return cls(
+            table_name,
+            lambda result: not missing_keys(result),
+            lambda result: f'Entries not found: keys={missing_keys(result)}, table="{table_name}"',
+            keys=keys,
+        )
+
+    @classmethod
+    def field_matches(cls, table_name: str, expected_entries: Dict[str, Dict[str, str]]) -> "WaitCheck":
+        """Check that the entries stored at the keys of `expected_entries` have their field/values."""
+
+        def mismatches(result):
+            return {
+                key: {"expected": expected_fields, "received": result.get(key, {})}
+                for key, expected_fields in expected_entries.items()
+                if not all(result.get(key, {}).get(k) == v for k, v in expected_fields.items())
+            }
+
+        return cls(
+            table_name,
+            lambda result: not mismatches(result),
+            lambda result: (
+                f'Expected field/value pairs not found: {mismatches(result)}, table="{table_name}"'
+            ),
+            keys=list(expected_entries),
+        )
+
+    @classmethod
+    def deleted_entries(cls, table_name: str, keys: List[str]) -> "WaitCheck":
+        """Check that no entries are stored at `keys`."""
+        return cls(
+            table_name,
+            lambda result: not result,
+            lambda result: f'Entries still exist: entries={result}, table="{table_name}"',
+            keys=list(dict.fromkeys(keys)),
+        )
+
+    @classmethod
+    def n_keys(cls, table_name: str, num_keys: int, wait_at_least_n_keys: bool = False) -> "WaitCheck":
+        """Check that the table has `num_keys` keys, or at least `num_keys` keys."""
+        def condition(result):
+            if wait_at_least_n_keys:
+                return len(result) >= num_keys
+            else:
+                return len(result) == num_keys
+
+        return cls(
+            table_name,
+            condition,
+            lambda result: (
+                f"Unexpected number of keys: expected={num_keys}, received={len(result)} "
+                f'({result}), table="{table_name}"'
+            ),
+        )
+
+    @classmethod
+    def matching_keys(cls, table_name: str, expected_keys: List[str]) -> "WaitCheck":
+        """Check that the specified keys exist in the table."""
+        return cls(
+            table_name,
+            lambda result: all(key in result for key in expected_keys),
+            lambda result: (
+                f"Expected keys not found: expected={expected_keys}, received={result}, "
+                f'table="{table_name}"'
+            ),
+        )
+
+    @classmethod
+    def deleted_keys(cls, table_name: str, deleted_keys: List[str]) -> "WaitCheck":
+        """Check that the specified keys do not exist in the table."""
+        return cls(
+            table_name,
+            lambda result: all(key not in result for key in deleted_keys),
+            lambda result: (
+                f"Unexpected keys found: expected={[key for key in result if key not in deleted_keys]}, "
+                f'received={result}, table="{table_name}"'
+            ),
+        )
 
 
 class DVSDatabase:
     """DVSDatabase provides access to redis databases on the virtual switch."""
 
-    def __init__(self, db_id: int, connector: str):
+    # The maximum number of entries fetched by a single pipelined request.
+    BULK_READ_BATCH_SIZE = 1000
+
+    def __init__(
+        self,
+        db_id: int,
+        connector: str,
+        keyspace_events: bool = True,
+        connections: Optional[DVSConnectionPool] = None,
+    ):
         """Initialize a DVSDatabase instance.
 
         Args:
             db_id: The integer ID used to identify the given database instance in redis.
             connector: The I/O connection used to communicate with
                 redis (e.g. UNIX socket, TCP socket, etc.).
+            keyspace_events: If set, the wait_for_* methods check the db again when they receive
+                a keyspace notification for the entries they are waiting for, rather than at
+                every polling interval. They fall back to polling if redis does not send
+                keyspace notifications.
+            connections: If set, the connections to redis are taken from this pool instead of
+                being opened by this instance.
         """
-        self.db_connection = swsscommon.DBConnector(db_id, connector, 0)
+        self.db_id = db_id
+        self.connector = connector
+        self.connections = connections
+        if connections:
+            self.db_connection = connections.get_connector(db_id)
+        else:
+            self.db_connection = swsscommon.DBConnector(db_id, connector, 0)
+        self.keyspace_events = keyspace_events
+        self._redis_client = None
+        self._keyspace_events_enabled = None
+        self._tables = {}
 
     def create_entry(self, table_name: str, key: str, entry: Dict[str, str]) -> None:
         """Add the mapping {`key` -> `entry`} to the specified table.
@@ -30,7 +374,7 @@ class DVSDatabase:
             key: The key that maps to the entry.
             entry: A set of key-value pairs to be stored.
         """
-        table = swsscommon.Table(self.db_connection, table_name)
+        table = self._get_table(table_name)
         formatted_entry = swsscommon.FieldValuePairs(list(entry.items()))
         table.set(key, formatted_entry)
 
@@ -42,7 +386,7 @@ class DVSDatabase:
             key: The key that needs to be updated.
             entry: A set of key-value pairs to be updated.
         """
-        table = swsscommon.Table(self.db_connection, table_name)
+        table = self._get_table(table_name)
         formatted_entry = swsscommon.FieldValuePairs(list(entry.items()))
         table.set(key, formatted_entry)
 
@@ -56,7 +400,7 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-        table = swsscommon.Table(self.db_connection, table_name)
+        table = self._get_table(table_name)
         (status, fv_pairs) = table.get(key)
 
         if not status:
@@ -71,9 +415,50 @@ class DVSDatabase:
             table_name: The name of the table where the entry is being removed.
             key: The key that maps to the entry being removed.
         """
-        table = swsscommon.Table(self.db_connection, table_name)
+        table = self._get_table(table_name)
         table._del(key)  # pylint: disable=protected-access
 
+    def get_entries(self, table_name: str, keys: List[str]) -> Dict[str, Dict[str, str]]:
+        """Get the entries stored at `keys` in the specified table.
+
+        The entries are fetched in batches of pipelined requests, rather than with one request
+        per entry.
+
+        Args:
+            table_name: The name of the table where the entries are stored.
+            keys: The keys that map to the entries being retrieved.
+
+        Returns:
+            The entries stored at `keys`, mapped by key. Keys with no entry are not included.
+        """
+        table = self._get_table(table_name)
+        client = self._get_redis_client()
+        entries = {}
+
+        for start in range(0, len(keys), self.BULK_READ_BATCH_SIZE):
+            batch = keys[start:start + self.BULK_READ_BATCH_SIZE]
+            pipe = client.pipeline(transaction=False)
+            for key in batch:
+                pipe.hgetall(table.getKeyName(key))
+
+            for key, fv_pairs in zip(batch, pipe.execute()):
+                if fv_pairs:
+                    entries[key] = fv_pairs
+
+        return entries
+
+    def get_table(self, table_name: str) -> Dict[str, Dict[str, str]]:
+        """Get all of the entries stored in the specified table.
+
+        Args:
+            table_name: The name of the table from which to fetch the entries.
+
+        Returns:
+            The entries stored in the table, mapped by key. If no entries are found, then an
+            empty Dict is returned.
+        """
+        return self.get_entries(table_name, self.get_keys(table_name))
+
     def get_keys(self, table_name: str) -> List[str]:
         """Get all of the keys stored in the specified table.
 
@@ -83,11 +468,85 @@ class DVSDatabase:
         Returns:
             The keys stored in the table. If no keys are found, then an empty List is returned.
         """
-        table = swsscommon.Table(self.db_connection, table_name)
+        table = self._get_table(table_name)
         keys = table.getKeys()
 
         return keys if keys else []
 
+    def snapshot(self, tables: List[str]) -> Snapshot:
+        """Get all of the entries stored in the specified tables at once.
+
+        The keys are listed with SCAN, then all the entries are fetched in a single transaction,
+        so that they are read in a consistent state. A table name can also be a prefix of several
+        tables, e.g. "ASIC_STATE" for all the SAI objects in ASIC DB. Keys which do not hold a
+        hash, e.g. the key sets of the producer tables, are left out.
+
+        Args:
+            tables: The names of the tables to capture.
+
+        Returns:
+            The entries stored in the tables, mapped by table name and then by key.
+        """
+        client = self._get_redis_client()
+        snapshot = {}
+        redis_keys = []
+
+        for table_name in tables:
+            prefix = self._get_key_prefix(table_name)
+            snapshot[table_name] = {}
+            for redis_key in dict.fromkeys(
+                client.scan_iter(match=escape_glob(prefix) + "*", count=self.BULK_READ_BATCH_SIZE)
+            ):
+                redis_keys.append((table_name, redis_key[len(prefix):], redis_key))
+
+        pipe = client.pipeline(transaction=True)
+        for _, _, redis_key in redis_keys:
+            pipe.hgetall(redis_key)
+
+        for (table_name, key, _), fv_pairs in zip(redis_keys, pipe.execute(raise_on_error=False)):
+            if fv_pairs and not isinstance(fv_pairs, redis.ResponseError):
+                snapshot[table_name][key] = fv_pairs
+
+        return snapshot
+
+    @staticmethod
+    def diff(snapshot_a: Snapshot, snapshot_b: Snapshot) -> SnapshotDiff:
+        """Get the differences between two snapshots of the database.
+
+        Args:
+            snapshot_a: The first snapshot, e.g. taken before a warm restart.
+            snapshot_b: The second snapshot, e.g. taken after a warm restart.
+
+        Returns:
+            The entries which were added, removed and changed from `snapshot_a` to `snapshot_b`.
+        """
+        result = SnapshotDiff()
+
+        for table_name in dict.fromkeys([*snapshot_a, *snapshot_b]):
+            entries_a = snapshot_a.get(table_name, {})
+            entries_b = snapshot_b.get(table_name, {})
+
+            added = {key: entry for key, entry in entries_b.items() if key not in entries_a}
+            removed = {key: entry for key, entry in entries_a.items() if key not in entries_b}
+            changed = {}
+            for key in entries_a.keys() & entries_b.keys():
+                entry_a, entry_b = entries_a[key], entries_b[key]
+                if entry_a != entry_b:
+                    changed[key] = {
+                        field: (entry_a.get(field), entry_b.get(field))
+                        for field in dict.fromkeys([*entry_a, *entry_b])
+                        if entry_a.get(field) != entry_b.get(field)
+                    }
+
+            if added:
+                result.added[table_name] = added
+            if removed:
+                result.removed[table_name] = removed
+            if changed:
+                result.changed[table_name] = changed
+
+        return result
+
     def wait_for_entry(
         self,
         table_name: str,
@@ -107,15 +566,9 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (bool(fv_pairs), fv_pairs)
-
-        message = failure_message or f'Entry not found: key="{key}", table="{table_name}"'
-        _, result = wait_for_result(access_function, polling_config, message)
-
-        return result
+        return self._wait_for_check(
+            WaitCheck.entry(table_name, key), polling_config, failure_message
+        )
 
     def wait_for_fields(
         self,
@@ -141,24 +594,10 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (all(field in fv_pairs for field in expected_fields), fv_pairs)
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.fields(table_name, key, expected_fields), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Expected fields not found: expected={expected_fields}, received={result}, "
-                f'key="{key}", table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_field_match(
         self,
         table_name: str,
@@ -183,27 +622,10 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (
-                all(fv_pairs.get(k) == v for k, v in expected_fields.items()),
-                fv_pairs,
-            )
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.field_match(table_name, key, expected_fields), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Expected field/value pairs not found: expected={expected_fields}, "
-                f'received={result}, key="{key}", table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_field_negative_match(
         self,
         table_name: str,
@@ -228,27 +650,10 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (
-                all(k in fv_pairs and fv_pairs[k] != v for k, v in old_fields.items()),
-                fv_pairs,
-            )
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.field_negative_match(table_name, key, old_fields), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Did not expect field/values to match, but they did: provided={old_fields}, "
-                f'received={result}, key="{key}", table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_exact_match(
         self,
         table_name: str,
@@ -272,24 +677,10 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
-
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (fv_pairs == expected_entry, fv_pairs)
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.exact_match(table_name, key, expected_entry), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Exact match not found: expected={expected_entry}, received={result}, "
-                f'key="{key}", table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_deleted_entry(
         self,
         table_name: str,
@@ -309,22 +700,90 @@ class DVSDatabase:
         Returns:
             The entry stored at `key`. If no entry is found, then an empty Dict is returned.
         """
+        return self._wait_for_check(
+            WaitCheck.deleted_entry(table_name, key), polling_config, failure_message
+        )
 
-        def access_function():
-            fv_pairs = self.get_entry(table_name, key)
-            return (not bool(fv_pairs), fv_pairs)
+    def wait_for_entries(
+        self,
+        table_name: str,
+        keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Wait for the entries stored at `keys` in the specified table to exist and retrieve them.
 
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        All the entries are checked in a single polling loop, each iteration fetching them with
+        bulk reads.
+
+        Args:
+            table_name: The name of the table where the entries are stored.
+            keys: The keys that map to the entries being retrieved.
+            polling_config: The parameters to use to poll the db.
+            failure_message: The message to print if the call times out. This will only take effect
+                if the PollingConfig is set to strict.
+
+        Returns:
+            The entries stored at `keys`, mapped by key. Keys with no entry are not included.
+        """
+        return self._wait_for_check(
+            WaitCheck.entries(table_name, keys), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f'Entry still exists: entry={result}, key="{key}", table="{table_name}"'
-            )
-            assert not polling_config.strict, message
+    def wait_for_field_matches(
+        self,
+        table_name: str,
+        expected_entries: Dict[str, Dict[str, str]],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Wait for the entries stored in the specified table to have the specified field/values.
 
-        return result
+        This is the bulk version of `wait_for_field_match`: all the entries are checked in a
+        single polling loop, each iteration fetching them with bulk reads.
+
+        Args:
+            table_name: The name of the table where the entries are stored.
+            expected_entries: The fields and their values we expect to see in the entries,
+                mapped by key.
+            polling_config: The parameters to use to poll the db.
+            failure_message: The message to print if the call times out. This will only take effect
+                if the PollingConfig is set to strict.
+
+        Returns:
+            The entries stored at the keys of `expected_entries`, mapped by key. Keys with no entry
+            are not included.
+        """
+        return self._wait_for_check(
+            WaitCheck.field_matches(table_name, expected_entries), polling_config, failure_message
+        )
+
+    def wait_for_deleted_entries(
+        self,
+        table_name: str,
+        keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Wait for no entries to exist at `keys` in the specified table.
+
+        All the entries are checked in a single polling loop, each iteration fetching them with
+        bulk reads.
+
+        Args:
+            table_name: The name of the table being checked.
+            keys: The keys to be checked.
+            polling_config: The parameters to use to poll the db.
+            failure_message: The message to print if the call times out. This will only take effect
+                if the PollingConfig is set to strict.
+
+        Returns:
+            The entries still stored at `keys`, mapped by key. If all the entries were deleted, then
+            an empty Dict is returned.
+        """
+        return self._wait_for_check(
+            WaitCheck.deleted_entries(table_name, keys), polling_config, failure_message
+        )
 
     def wait_for_n_keys(
         self,
@@ -346,27 +805,10 @@ class DVSDatabase:
         Returns:
             The keys stored in the table. If no keys are found, then an empty List is returned.
         """
-
-        def access_function():
-            keys = self.get_keys(table_name)
-            if wait_at_least_n_keys:
-                return (len(keys) >= num_keys, keys)
-            else:
-                return (len(keys) == num_keys, keys)
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.n_keys(table_name, num_keys, wait_at_least_n_keys), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Unexpected number of keys: expected={num_keys}, received={len(result)} "
-                f'({result}), table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_matching_keys(
         self,
         table_name: str,
@@ -386,24 +828,10 @@ class DVSDatabase:
         Returns:
             The keys stored in the table. If no keys are found, then an empty List is returned.
         """
-
-        def access_function():
-            keys = self.get_keys(table_name)
-            return (all(key in keys for key in expected_keys), keys)
-
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        return self._wait_for_check(
+            WaitCheck.matching_keys(table_name, expected_keys), polling_config, failure_message
         )
 
-        if not status:
-            message = failure_message or (
-                f"Expected keys not found: expected={expected_keys}, received={result}, "
-                f'table="{table_name}"'
-            )
-            assert not polling_config.strict, message
-
-        return result
-
     def wait_for_deleted_keys(
         self,
         table_name: str,
@@ -423,28 +851,308 @@ class DVSDatabase:
         Returns:
             The keys stored in the table. If no keys are found, then an empty List is returned.
         """
+        return self._wait_for_check(
+            WaitCheck.deleted_keys(table_name, deleted_keys), polling_config, failure_message
+        )
+
+    def _read(self, check: WaitCheck):
+        """Read the data checked by `check`."""
+        if check.key is not None:
+            return self.get_entry(check.table_name, check.key)
+
+        if check.keys is not None:
+            return self.get_entries(check.table_name, check.keys)
+
+        return self.get_keys(check.table_name)
+
+    def _wait_for_check(
+        self,
+        check: WaitCheck,
+        polling_config: PollingConfig,
+        failure_message: Optional[str],
+    ):
+        """Wait for `check` to be satisfied and get the result of the wait."""
 
         def access_function():
-            keys = self.get_keys(table_name)
-            return (all(key not in keys for key in deleted_keys), keys)
+            data = self._read(check)
+            return (check.condition(data), data)
 
-        status, result = wait_for_result(
-            access_function, self._disable_strict_polling(polling_config)
+        status, data = self._wait_for_result(
+            access_function, self._disable_strict_polling(polling_config), check.table_name, check.key
         )
 
-        if not status:
-            expected = [key for key in result if key not in deleted_keys]
-            message = failure_message or (
-                f"Unexpected keys found: expected={expected}, received={result}, "
-                f'table="{table_name}"'
+        return check.outcome(status, data, polling_config, failure_message)
+
+    def _wait_for_result(
+        self,
+        access_function,
+        polling_config: PollingConfig,
+        table_name: str,
+        key: Optional[str] = None,
+        failure_message: str = None,
+    ):
+        """Run `access_function` until it succeeds, each time `table_name` or `key` changes.
+
+        The db is checked once before subscribing to the keyspace notifications, so that no
+        subscription is made when the expected data is already there. Polling is used instead if
+        keyspace notifications are not available.
+        """
+        first_result = access_function()
+        watcher = None
+        if not first_result[0] and polling_config.polling_interval:
+            watcher = self._watch(table_name, key)
+
+        if watcher:
+            # Changes made before the subscription are not notified, the first attempt checks
+            # the db again.
+            polling_function = access_function
+        else:
+            pending_first_result = [first_result]
+
+            def polling_function():
+                return pending_first_result.pop() if pending_first_result else access_function()
+
+        try:
+            return wait_for_result(
+                polling_function,
+                polling_config,
+                failure_message,
+                watcher.wait if watcher else None,
+                table_name,
             )
-            assert not polling_config.strict, message
+        finally:
+            if watcher:
+                watcher.close()
 
-        return result
+    def mirror_table(
+        self,
+        table_name: str,
+        indexes: Optional[Dict[str, Callable[[str, Dict[str, str]], Hashable]]] = None,
+    ) -> "TableMirror":
+        """Get a local copy of the specified table, kept up to date from keyspace notifications.
+
+        Args:
+            table_name: The name of the table to mirror.
+            indexes: The functions computing the index values of an entry, mapped by index name.
+                Defaults to the indexes in `DEFAULT_MIRROR_INDEXES` for the table, if any.
+
+        Returns:
+            The mirror of the table. It should be closed once it is no longer used.
+        """
+        if indexes is None:
+            indexes = DEFAULT_MIRROR_INDEXES.get(table_name, {})
+
+        return TableMirror(self, table_name, indexes)
+
+    def _get_table(self, table_name: str) -> swsscommon.Table:
+        if table_name not in self._tables:
+            self._tables[table_name] = swsscommon.Table(self.db_connection, table_name)
+
+        return self._tables[table_name]
+
+    def _get_key_prefix(self, table_name: str) -> str:
+        # getKeyName("") is only the table name, without the separator
+        return table_name + self._get_table(table_name).getTableNameSeparator()
+
+    def _get_redis_client(self) -> redis.Redis:
+        if self.connections:
+            return self.connections.get_redis_client(self.db_id)
+
+        if not self._redis_client:
+            self._redis_client = redis.Redis(unix_socket_path=self.connector, db=self.db_id,
+                                             encoding="utf-8", decode_responses=True)
+
+        return self._redis_client
+
+    def _watch(self, table_name: str, key: Optional[str] = None) -> Optional[KeyspaceWatcher]:
+        if not self.keyspace_events:
+            return None
+
+        try:
+            if self._keyspace_events_enabled is None:
+                events = self._get_redis_client().config_get("notify-keyspace-events")
+                events = events.get("notify-keyspace-events", "")
+                # Keyspace notifications ("K") of all the commands ("A") or of the commands used
+                # by the tables: generic ("g") and hash ("h") ones
+                self._keyspace_events_enabled = "K" in events and (
+                    "A" in events or ("g" in events and "h" in events)
+                )
+
+            if not self._keyspace_events_enabled:
+                return None
+
+            if key is None:
+                pattern = escape_glob(self._get_key_prefix(table_name)) + "*"
+            else:
+                pattern = escape_glob(self._get_table(table_name).getKeyName(key))
+
+            return KeyspaceWatcher(self._get_redis_client(), self.db_id, [pattern])
+        except redis.RedisError:
+            self.keyspace_events = False
+            return None
 
     @staticmethod
     def _disable_strict_polling(polling_config: PollingConfig) -> PollingConfig:
-        disabled_config = PollingConfig(
-            polling_config.polling_interval, polling_config.timeout, False
-        )
+        disabled_config = dataclasses.replace(polling_config, strict=False)
         return disabled_config
+
+
+class TableMirror:
+    """TableMirror keeps a local copy of a table, updated from keyspace notifications.
+
+    The table is only loaded once, afterwards only the entries which were notified are fetched
+    again. If keyspace notifications are not available, the whole table is loaded on every
+    refresh.
+
+    Entries can be looked up through indexes. An index function computes the index value of an
+    entry from its key and fields, or returns None to leave the entry out of the index.
+    """
+
+    def __init__(
+        self,
+        db: DVSDatabase,
+        table_name: str,
+        indexes: Dict[str, Callable[[str, Dict[str, str]], Hashable]],
+    ):
+        """Initialize a TableMirror instance and load the table.
+
+        Args:
+            db: The database of the table.
+            table_name: The name of the table to mirror.
+            indexes: The functions computing the index values of an entry, mapped by index name.
+        """
+        self.db = db
+        self.table_name = table_name
+        self.index_functions = indexes
+        self.entries = {}
+        self.indexes = {}
+        self._key_prefix = db._get_key_prefix(table_name)  # pylint: disable=protected-access
+        self._watcher = db._watch(table_name)  # pylint: disable=protected-access
+        self._load()
+
+    def __enter__(self) -> "TableMirror":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop updating the mirror."""
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+
+    def refresh(self) -> None:
+        """Apply the changes made to the table since the last refresh."""
+        if not self._watcher:
+            self._load()
+            return
+
+        changed_keys = [
+            key[len(self._key_prefix):]
+            for key in self._watcher.get_changed_keys()
+            if key.startswith(self._key_prefix)
+        ]
+        if not changed_keys:
+            return
+
+        entries = self.db.get_entries(self.table_name, changed_keys)
+        for key in changed_keys:
+            self._remove(key)
+            if key in entries:
+                self._add(key, entries[key])
+
+    def get_keys(self) -> List[str]:
+        """Get all of the keys stored in the mirror."""
+        return list(self.entries)
+
+    def get_entry(self, key: str) -> Dict[str, str]:
+        """Get the entry stored at `key` in the mirror, or an empty Dict if there is none."""
+        return self.entries.get(key, {})
+
+    def lookup(self, index: str, value: Hashable) -> Dict[str, Dict[str, str]]:
+        """Get the entries with the given index value.
+
+        Args:
+            index: The name of the index.
+            value: The index value of the entries.
+
+        Returns:
+            The matching entries, mapped by key. If no entries are found, then an empty Dict is
+            returned.
+        """
+        return {key: self.entries[key] for key in self.indexes[index].get(value, ())}
+
+    def wait_for(
+        self,
+        condition: Callable[["TableMirror"], bool],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> bool:
+        """Wait for the mirror to satisfy `condition`.
+
+        The condition is checked again each time the table changes.
+
+        Args:
+            condition: The function checking the mirror.
+            polling_config: The parameters to use to poll the db.
+            failure_message: The message to print if the call times out. This will only take effect
+                if the PollingConfig is set to strict.
+
+        Returns:
+            True if the condition was satisfied, False otherwise.
+        """
+
+        def access_function():
+            self.refresh()
+            return (condition(self), None)
+
+        message = failure_message or f'Condition not met by table "{self.table_name}"'
+        status, _ = wait_for_result(
+            access_function,
+            polling_config,
+            message,
+            self._watcher.wait if self._watcher else None,
+            self.table_name,
+        )
+
+        return status
+
+    def _load(self) -> None:
+        if self._watcher:
+            self._watcher.get_changed_keys()
+
+        self.entries = {}
+        self.indexes = {name: {} for name in self.index_functions}
+        for key, entry in self.db.get_table(self.table_name).items():
+            self._add(key, entry)
+
+    def _add(self, key: str, entry: Dict[str, str]) -> None:
+        self.entries[key] = entry
+        for name, index_function in self.index_functions.items():
+            value = index_function(key, entry)
+            if value is not None:
+                self.indexes[name].setdefault(value, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        for name, index_function in self.index_functions.items():
+            value = index_function(key, entry)
+            keys = self.indexes[name].get(value)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.indexes[name][value]
+
+
+# Indexes used by `DVSDatabase.mirror_table` for the tables it is commonly used with.
+DEFAULT_MIRROR_INDEXES = {
+    **SAI_KEY_INDEXES,
+    "ASIC_STATE:SAI_OBJECT_TYPE_NEXT_HOP_GROUP_MEMBER": {
+        "group": lambda key, entry: entry.get("SAI_NEXT_HOP_GROUP_MEMBER_ATTR_NEXT_HOP_GROUP_ID"),
+    },
+}
+
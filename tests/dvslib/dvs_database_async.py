@@ -0,0 +1,520 @@
+"""Utilities for interacting with redis from asyncio when writing VS tests.
+
+AsyncDVSDatabase is the asyncio counterpart of DVSDatabase: its wait_for_* methods are coroutines,
+so the checks of several databases can run concurrently rather than one after another, e.g.:
+
+    asic_db, state_db = dvs.get_async_db(dvs.ASIC_DB_ID), dvs.get_async_db(dvs.STATE_DB_ID)
+    route, port = wait_for_all(
+        asic_db.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY", 10, True),
+        state_db.wait_for_field_match("PORT_TABLE", "Ethernet0", {"state": "ok"}),
+    )
+"""
+import asyncio
+import dataclasses
+import weakref
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import redis
+import redis.asyncio
+from swsscommon import swsscommon
+from dvslib.dvs_common import escape_glob, wait_for_result_async, PollingConfig
+from dvslib.dvs_connections import DVSConnectionPool
+from dvslib.dvs_database import KeyspaceChannels, WaitCheck
+
+
+class AsyncKeyspaceWatcher(KeyspaceChannels):
+    """AsyncKeyspaceWatcher waits for keyspace notifications of a set of redis keys.
+
+    This is the asyncio version of `KeyspaceWatcher`.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, db_id: int, key_patterns: List[str]):
+        """Initialize an AsyncKeyspaceWatcher instance, `subscribe` must be awaited before use.
+
+        Args:
+            client: The asyncio redis client of the database.
+            db_id: The integer ID of the database in redis.
+            key_patterns: The glob-style patterns of the watched keys.
+        """
+        KeyspaceChannels.__init__(self, db_id, key_patterns)
+        self.pubsub = client.pubsub()
+
+    async def subscribe(self) -> None:
+        """Subscribe to the keyspace notifications of the watched keys."""
+        await self.pubsub.psubscribe(*self.channel_patterns)
+
+        # Make sure the subscription is active before the data is first checked, so that no
+        # change can be missed.
+        for _ in self.channel_patterns:
+            await self.pubsub.get_message(timeout=self.FALLBACK_INTERVAL)
+
+    async def wait(self, timeout: float) -> None:
+        """Wait for a notification of a watched key.
+
+        Args:
+            timeout: The maximum amount of time to wait, in seconds.
+        """
+        message = await self.pubsub.get_message(timeout=min(timeout, self.FALLBACK_INTERVAL))
+
+        # Several notifications are usually received for a single update, they are all
+        # handled by the next check.
+        while message:
+            self._record(message)
+            message = await self.pubsub.get_message()
+
+    async def close(self) -> None:
+        """Unsubscribe from the keyspace notifications."""
+        await self.pubsub.aclose()
+
+
+class AsyncDVSDatabase:
+    """AsyncDVSDatabase provides asyncio access to redis databases on the virtual switch.
+
+    The redis client is bound to the event loop it is first used from. A new client is created
+    when the database is used from another event loop, so the same instance can be used with
+    successive `asyncio.run` calls.
+    """
+
+    # The maximum number of entries fetched by a single pipelined request.
+    BULK_READ_BATCH_SIZE = 1000
+
+    def __init__(
+        self,
+        db_id: int,
+        connector: str,
+        keyspace_events: bool = True,
+        connections: Optional[DVSConnectionPool] = None,
+    ):
+        """Initialize an AsyncDVSDatabase instance.
+
+        Args:
+            db_id: The integer ID used to identify the given database instance in redis.
+            connector: The UNIX socket used to communicate with redis.
+            keyspace_events: If set, the wait_for_* methods check the db again when they receive
+                a keyspace notification for the entries they are waiting for, rather than at
+                every polling interval. They fall back to polling if redis does not send
+                keyspace notifications.
+            connections: If set, the DBConnector used to look up the table name separator is
+                taken from this pool instead of being opened by this instance.
+        """
+        self.db_id = db_id
+        self.connector = connector
+        self.keyspace_events = keyspace_events
+        if connections:
+            db_connection = connections.get_connector(db_id)
+        else:
+            db_connection = swsscommon.DBConnector(db_id, connector, 0)
+        self.separator = swsscommon.Table(db_connection, "").getTableNameSeparator()
+        self._redis_client = None
+        self._redis_client_loop = None
+        self._keyspace_events_enabled = None
+
+    async def create_entry(self, table_name: str, key: str, entry: Dict[str, str]) -> None:
+        """Add the mapping {`key` -> `entry`} to the specified table.
+
+        Args:
+            table_name: The name of the table to add the entry to.
+            key: The key that maps to the entry.
+            entry: A set of key-value pairs to be stored.
+        """
+        await self._get_redis_client().hset(self._get_key_name(table_name, key), mapping=entry)
+
+    async def update_entry(self, table_name: str, key: str, entry: Dict[str, str]) -> None:
+        """Update entry of an existing key in the specified table.
+
+        Args:
+            table_name: The name of the table.
+            key: The key that needs to be updated.
+            entry: A set of key-value pairs to be updated.
+        """
+        await self._get_redis_client().hset(self._get_key_name(table_name, key), mapping=entry)
+
+    async def get_entry(self, table_name: str, key: str) -> Dict[str, str]:
+        """Get the entry stored at `key` in the specified table.
+
+        Args:
+            table_name: The name of the table where the entry is stored.
+            key: The key that maps to the entry being retrieved.
+
+        Returns:
+            The entry stored at `key`. If no entry is found, then an empty Dict is returned.
+        """
+        return await self._get_redis_client().hgetall(self._get_key_name(table_name, key))
+
+    async def delete_entry(self, table_name: str, key: str) -> None:
+        """Remove the entry stored at `key` in the specified table.
+
+        Args:
+            table_name: The name of the table where the entry is being removed.
+            key: The key that maps to the entry being removed.
+        """
+        await self._get_redis_client().delete(self._get_key_name(table_name, key))
+
+    async def get_entries(self, table_name: str, keys: List[str]) -> Dict[str, Dict[str, str]]:
+        """Get the entries stored at `keys` in the specified table.
+
+        The entries are fetched in batches of pipelined requests, rather than with one request
+        per entry.
+
+        Args:
+            table_name: The name of the table where the entries are stored.
+            keys: The keys that map to the entries being retrieved.
+
+        Returns:
+            The entries stored at `keys`, mapped by key. Keys with no entry are not included.
+        """
+        client = self._get_redis_client()
+        entries = {}
+
+        for start in range(0, len(keys), self.BULK_READ_BATCH_SIZE):
+            batch = keys[start:start + self.BULK_READ_BATCH_SIZE]
+            pipe = client.pipeline(transaction=False)
+            for key in batch:
+                pipe.hgetall(self._get_key_name(table_name, key))
+
+            for key, fv_pairs in zip(batch, await pipe.execute()):
+                if fv_pairs:
+                    entries[key] = fv_pairs
+
+        return entries
+
+    async def get_table(self, table_name: str) -> Dict[str, Dict[str, str]]:
+        """Get all of the entries stored in the specified table.
+
+        Args:
+            table_name: The name of the table from which to fetch the entries.
+
+        Returns:
+            The entries stored in the table, mapped by key. If no entries are found, then an
+            empty Dict is returned.
+        """
+        return await self.get_entries(table_name, await self.get_keys(table_name))
+
+    async def get_keys(self, table_name: str) -> List[str]:
+        """Get all of the keys stored in the specified table.
+
+        Args:
+            table_name: The name of the table from which to fetch the keys.
+
+        Returns:
+            The keys stored in the table. If no keys are found, then an empty List is returned.
+        """
+        prefix = self._get_key_name(table_name, "")
+        redis_keys = await self._get_redis_client().keys(escape_glob(prefix) + "*")
+
+        return [redis_key[len(prefix):] for redis_key in redis_keys]
+
+    async def wait_for_entry(
+        self,
+        table_name: str,
+        key: str,
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_entry`."""
+        return await self._wait_for_check(
+            WaitCheck.entry(table_name, key), polling_config, failure_message
+        )
+
+    async def wait_for_fields(
+        self,
+        table_name: str,
+        key: str,
+        expected_fields: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_fields`."""
+        return await self._wait_for_check(
+            WaitCheck.fields(table_name, key, expected_fields), polling_config, failure_message
+        )
+
+    async def wait_for_field_match(
+        self,
+        table_name: str,
+        key: str,
+        expected_fields: Dict[str, str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_field_match`."""
+        return await self._wait_for_check(
+            WaitCheck.field_match(table_name, key, expected_fields), polling_config, failure_message
+        )
+
+    async def wait_for_field_negative_match(
+        self,
+        table_name: str,
+        key: str,
+        old_fields: Dict[str, str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_field_negative_match`."""
+        return await self._wait_for_check(
+            WaitCheck.field_negative_match(table_name, key, old_fields), polling_config, failure_message
+        )
+
+    async def wait_for_exact_match(
+        self,
+        table_name: str,
+        key: str,
+        expected_entry: Dict[str, str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_exact_match`."""
+        return await self._wait_for_check(
+            WaitCheck.exact_match(table_name, key, expected_entry), polling_config, failure_message
+        )
+
+    async def wait_for_deleted_entry(
+        self,
+        table_name: str,
+        key: str,
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, str]:
+        """Asyncio version of `DVSDatabase.wait_for_deleted_entry`."""
+        return await self._wait_for_check(
+            WaitCheck.deleted_entry(table_name, key), polling_config, failure_message
+        )
+
+    async def wait_for_entries(
+        self,
+        table_name: str,
+        keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Asyncio version of `DVSDatabase.wait_for_entries`."""
+        return await self._wait_for_check(
+            WaitCheck.entries(table_name, keys), polling_config, failure_message
+        )
+
+    async def wait_for_field_matches(
+        self,
+        table_name: str,
+        expected_entries: Dict[str, Dict[str, str]],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Asyncio version of `DVSDatabase.wait_for_field_matches`."""
+        return await self._wait_for_check(
+            WaitCheck.field_matches(table_name, expected_entries), polling_config, failure_message
+        )
+
+    async def wait_for_deleted_entries(
+        self,
+        table_name: str,
+        keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> Dict[str, Dict[str, str]]:
+        """Asyncio version of `DVSDatabase.wait_for_deleted_entries`."""
+        return await self._wait_for_check(
+            WaitCheck.deleted_entries(table_name, keys), polling_config, failure_message
+        )
+
+    async def wait_for_n_keys(
+        self,
+        table_name: str,
+        num_keys: int,
+        wait_at_least_n_keys: bool = False,
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> List[str]:
+        """Asyncio version of `DVSDatabase.wait_for_n_keys`."""
+        return await self._wait_for_check(
+            WaitCheck.n_keys(table_name, num_keys, wait_at_least_n_keys), polling_config, failure_message
+        )
+
+    async def wait_for_matching_keys(
+        self,
+        table_name: str,
+        expected_keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> List[str]:
+        """Asyncio version of `DVSDatabase.wait_for_matching_keys`."""
+        return await self._wait_for_check(
+            WaitCheck.matching_keys(table_name, expected_keys), polling_config, failure_message
+        )
+
+    async def wait_for_deleted_keys(
+        self,
+        table_name: str,
+        deleted_keys: List[str],
+        polling_config: PollingConfig = PollingConfig(),
+        failure_message: str = None,
+    ) -> List[str]:
+        """Asyncio version of `DVSDatabase.wait_for_deleted_keys`."""
+        return await self._wait_for_check(
+            WaitCheck.deleted_keys(table_name, deleted_keys), polling_config, failure_message
+        )
+
+    async def close(self) -> None:
+        """Close the redis client of the current event loop."""
+        if self._redis_client and self._redis_client_loop is asyncio.get_running_loop():
+            await self._redis_client.aclose()
+
+        self._redis_client = None
+        self._redis_client_loop = None
+
+    async def _read(self, check: WaitCheck):
+        """Read the data checked by `check`."""
+        if check.key is not None:
+            return await self.get_entry(check.table_name, check.key)
+
+        if check.keys is not None:
+            return await self.get_entries(check.table_name, check.keys)
+
+        return await self.get_keys(check.table_name)
+
+    async def _wait_for_check(
+        self,
+        check: WaitCheck,
+        polling_config: PollingConfig,
+        failure_message: Optional[str],
+    ):
+        """Wait for `check` to be satisfied and get the result of the wait."""
+
+        async def access_function():
+            data = await self._read(check)
+            return (check.condition(data), data)
+
+        status, data = await self._wait_for_result(
+            access_function,
+            dataclasses.replace(polling_config, strict=False),
+            check.table_name,
+            check.key,
+        )
+
+        return check.outcome(status, data, polling_config, failure_message)
+
+    async def _wait_for_result(
+        self,
+        access_function: Callable[[], Awaitable[Tuple[bool, Any]]],
+        polling_config: PollingConfig,
+        table_name: str,
+        key: Optional[str] = None,
+        failure_message: str = None,
+    ):
+        """Run `access_function` until it succeeds, each time `table_name` or `key` changes.
+
+        As in `DVSDatabase`, the db is checked once before subscribing to the keyspace
+        notifications, and polling is used instead if they are not available.
+        """
+        first_result = await access_function()
+        watcher = None
+        if not first_result[0] and polling_config.polling_interval:
+            watcher = await self._watch(table_name, key)
+
+        if watcher:
+            # Changes made before the subscription are not notified, the first attempt checks
+            # the db again.
+            polling_function = access_function
+        else:
+            pending_first_result = [first_result]
+
+            async def polling_function():
+                return pending_first_result.pop() if pending_first_result else await access_function()
+
+        try:
+            return await wait_for_result_async(
+                polling_function,
+                polling_config,
+                failure_message,
+                watcher.wait if watcher else None,
+                table_name,
+            )
+        finally:
+            if watcher:
+                await watcher.close()
+
+    def _get_key_name(self, table_name: str, key: str) -> str:
+        return f"{table_name}{self.separator}{key}"
+
+    def _get_redis_client(self) -> redis.asyncio.Redis:
+        loop = asyncio.get_running_loop()
+        if not self._redis_client or self._redis_client_loop is not loop:
+            self._redis_client = redis.asyncio.Redis(unix_socket_path=self.connector, db=self.db_id,
+                                                     encoding="utf-8", decode_responses=True)
+            self._redis_client_loop = loop
+            _open_databases.add(self)
+
+        return self._redis_client
+
+    async def _watch(self, table_name: str, key: Optional[str] = None) -> Optional[AsyncKeyspaceWatcher]:
+        if not self.keyspace_events:
+            return None
+
+        try:
+            if self._keyspace_events_enabled is None:
+                events = await self._get_redis_client().config_get("notify-keyspace-events")
+                events = events.get("notify-keyspace-events", "")
+                # Keyspace notifications ("K") of all the commands ("A") or of the commands used
+                # by the tables: generic ("g") and hash ("h") ones
+                self._keyspace_events_enabled = "K" in events and (
+                    "A" in events or ("g" in events and "h" in events)
+                )
+
+            if not self._keyspace_events_enabled:
+                return None
+
+            if key is None:
+                pattern = escape_glob(self._get_key_name(table_name, "")) + "*"
+            else:
+                pattern = escape_glob(self._get_key_name(table_name, key))
+
+            watcher = AsyncKeyspaceWatcher(self._get_redis_client(), self.db_id, [pattern])
+            await watcher.subscribe()
+            return watcher
+        except redis.RedisError:
+            self.keyspace_events = False
+            return None
+
+
+# The databases which may have an open redis client, closed by `wait_for_all` once its event loop
+# is done with them.
+_open_databases = weakref.WeakSet()
+
+
+async def gather_waits(*waits: Awaitable[Any]) -> List[Any]:
+    """Run the specified waits concurrently.
+
+    The waits are usually AsyncDVSDatabase wait_for_* calls on different databases. If one of
+    them fails, the others are cancelled.
+
+    Args:
+        waits: The waits to run.
+
+    Returns:
+        The results of the waits, in the same order.
+    """
+    tasks = [asyncio.ensure_future(wait) for wait in waits]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def wait_for_all(*waits: Awaitable[Any]) -> List[Any]:
+    """Run the specified waits concurrently from synchronous code.
+
+    Args:
+        waits: The waits to run, usually AsyncDVSDatabase wait_for_* calls on different
+            databases.
+
+    Returns:
+        The results of the waits, in the same order.
+    """
+
+    async def run():
+        try:
+            return await gather_waits(*waits)
+        finally:
+            await asyncio.gather(*[db.close() for db in list(_open_databases)])
+
+    return asyncio.run(run())
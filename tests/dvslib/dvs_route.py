@@ -1,28 +1,16 @@
-import json
-from dvslib.dvs_common import wait_for_result
-
 class DVSRoute(object):
     def __init__(self, adb, cdb):
         self.asic_db = adb
         self.config_db = cdb
 
     def check_asicdb_route_entries(self, destinations):
-        def _access_function():
-            route_entries = self.asic_db.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destinations = [json.loads(route_entry)["dest"]
-                                  for route_entry in route_entries]
-            return (all(destination in route_destinations for destination in destinations), None)
-
-        wait_for_result(_access_function)
+        with self.asic_db.mirror_table("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY") as routes:
+            routes.wait_for(lambda routes: all(routes.lookup("dest", destination)
+                                               for destination in destinations))
 
-        keys = self.asic_db.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-
-        return [k for k in keys if json.loads(k)['dest'] in destinations]
+            return [key for destination in destinations for key in routes.lookup("dest", destination)]
 
     def check_asicdb_deleted_route_entries(self, destinations):
-        def _access_function():
-            route_entries = self.asic_db.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destinations = [json.loads(route_entry)["dest"] for route_entry in route_entries]
-            return (all(destination not in route_destinations for destination in destinations), None)
-
-        wait_for_result(_access_function)
+        with self.asic_db.mirror_table("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY") as routes:
+            routes.wait_for(lambda routes: not any(routes.lookup("dest", destination)
+                                                   for destination in destinations))
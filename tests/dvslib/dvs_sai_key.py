@@ -0,0 +1,73 @@
+"""Utilities for the keys of the SAI objects stored in ASIC DB.
+
+The SAI objects which are not identified by an OID, such as routes, neighbors or FDB entries, have
+JSON encoded keys, e.g. `{"dest":"10.0.0.0/24","switch_id":"oid:0x21000000000000","vr":"oid:0x3000000000022"}`.
+The same keys are decoded again and again while polling ASIC DB, so decoding is memoized.
+"""
+import json
+
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, Hashable, Mapping, Optional
+
+# The maximum number of decoded keys that are cached.
+SAI_KEY_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=SAI_KEY_CACHE_SIZE)
+def decode_sai_key(key: str) -> Mapping[str, str]:
+    """Decode a JSON encoded SAI object key.
+
+    Args:
+        key: The key of the SAI object, without the object type.
+
+    Returns:
+        The fields of the key. The result is shared between calls, so it cannot be modified.
+    """
+    return MappingProxyType(json.loads(key))
+
+
+def sai_key_index(*fields: str) -> Callable[[str, Dict[str, str]], Optional[Hashable]]:
+    """Get an index function, as used by `DVSDatabase.mirror_table`, on SAI object key fields.
+
+    Args:
+        fields: The key fields the entries are indexed by.
+
+    Returns:
+        A function returning the value of the field for a single field, or the tuple of the
+        values of the fields otherwise. Entries whose key lacks any of the fields are not
+        indexed.
+    """
+
+    def index_function(key: str, entry: Dict[str, str]) -> Optional[Hashable]:
+        sai_key = decode_sai_key(key)
+        if any(field not in sai_key for field in fields):
+            return None
+
+        if len(fields) == 1:
+            return sai_key[fields[0]]
+
+        return tuple(sai_key[field] for field in fields)
+
+    return index_function
+
+
+# Indexes of the tables of SAI objects with JSON encoded keys, by key fields.
+SAI_KEY_INDEXES = {
+    "ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY": {
+        "dest": sai_key_index("dest"),
+        "vr": sai_key_index("vr"),
+        "dest_vr": sai_key_index("dest", "vr"),
+    },
+    "ASIC_STATE:SAI_OBJECT_TYPE_NEIGHBOR_ENTRY": {
+        "ip": sai_key_index("ip"),
+        "rif": sai_key_index("rif"),
+        "ip_rif": sai_key_index("ip", "rif"),
+    },
+    "ASIC_STATE:SAI_OBJECT_TYPE_FDB_ENTRY": {
+        "mac": sai_key_index("mac"),
+        "bvid": sai_key_index("bvid"),
+        "vlan": sai_key_index("vlan"),
+        "mac_bvid": sai_key_index("mac", "bvid"),
+    },
+}
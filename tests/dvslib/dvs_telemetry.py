@@ -0,0 +1,125 @@
+"""Collection of the time spent waiting by the VS tests.
+
+WaitTelemetry records every call to `wait_for_result`, which all the DVSDatabase wait methods go
+through, as well as the calls to `time.sleep` made outside of it. It is enabled for a test session
+by the --wait-telemetry options defined in conftest.py.
+
+Only the calls made through the `time` module are recorded, not those to a `sleep` imported with
+`from time import sleep`.
+"""
+import json
+import sys
+import time
+
+from typing import Dict, List, Optional
+
+from dvslib import dvs_common
+from dvslib.dvs_common import PollingStats, add_polling_stats_listener, find_caller, remove_polling_stats_listener
+
+
+class WaitTelemetry:
+    """WaitTelemetry collects the waits and sleeps of a test session."""
+
+    def __init__(self):
+        """Initialize a WaitTelemetry instance."""
+        self.current_test: Optional[str] = None
+        self.waits: List[Dict] = []
+        # (test, caller) -> [number of calls, total time]
+        self.sleeps: Dict[tuple, List[float]] = {}
+        self._sleep = None
+
+    def start(self) -> None:
+        """Start recording the waits and sleeps."""
+        add_polling_stats_listener(self.record_wait)
+        self._sleep = time.sleep
+        time.sleep = self._record_sleep
+
+    def stop(self) -> None:
+        """Stop recording the waits and sleeps."""
+        if self._sleep:
+            remove_polling_stats_listener(self.record_wait)
+            time.sleep = self._sleep
+            self._sleep = None
+
+    def record_wait(self, stats: PollingStats) -> None:
+        """Record a call to `wait_for_result`."""
+        self.waits.append({
+            "test": self.current_test,
+            "caller": stats.caller,
+            "table": stats.table,
+            "iterations": stats.iterations,
+            "elapsed": stats.elapsed,
+            "success": stats.success,
+            "timeout": stats.timeout,
+        })
+
+    def _record_sleep(self, seconds: float) -> None:
+        self._sleep(seconds)
+
+        # The sleeps between the polling attempts are accounted for in the waits
+        if sys._getframe(1).f_code is not dvs_common.wait_for_result.__code__:  # pylint: disable=protected-access
+            sleep = self.sleeps.setdefault((self.current_test, find_caller(2)), [0, 0.0])
+            sleep[0] += 1
+            sleep[1] += seconds
+
+    def total_wait_time(self) -> float:
+        """Get the total time spent in waits, in seconds."""
+        return sum(wait["elapsed"] for wait in self.waits)
+
+    def total_sleep_time(self) -> float:
+        """Get the total time spent in sleeps outside of waits, in seconds."""
+        return sum(total for _, total in self.sleeps.values())
+
+    def summary(self, top: int) -> List[str]:
+        """Get a report of the `top` slowest waits and sleep callers.
+
+        Args:
+            top: The number of waits and sleep callers to report.
+
+        Returns:
+            The lines of the report.
+        """
+        lines = [
+            f"{len(self.waits)} waits: {self.total_wait_time():.1f}s, "
+            f"{sum(count for count, _ in self.sleeps.values())} sleeps: {self.total_sleep_time():.1f}s",
+            "",
+            f"Slowest {top} waits:",
+        ]
+        for wait in sorted(self.waits, key=lambda wait: wait["elapsed"], reverse=True)[:top]:
+            status = "ok" if wait["success"] else "timed out"
+            lines.append(
+                f"{wait['elapsed']:8.2f}s {wait['iterations']:6d} iterations {status:9s} "
+                f"{wait['caller']} {wait['table'] or ''} [{wait['test']}]"
+            )
+
+        # Sleep time per caller over all the tests
+        sleep_callers = {}
+        for (_, caller), (count, total) in self.sleeps.items():
+            caller_sleeps = sleep_callers.setdefault(caller, [0, 0.0])
+            caller_sleeps[0] += count
+            caller_sleeps[1] += total
+
+        lines += ["", f"Top {top} time.sleep() callers:"]
+        for caller, (count, total) in sorted(sleep_callers.items(), key=lambda item: item[1][1],
+                                             reverse=True)[:top]:
+            lines.append(f"{total:8.2f}s {count:6d} calls {caller}")
+
+        return lines
+
+    def dump(self, path: str) -> None:
+        """Write all the waits and sleeps to a JSON file.
+
+        Args:
+            path: The path of the file.
+        """
+        sleeps = [
+            {"test": test, "caller": caller, "count": count, "total": total}
+            for (test, caller), (count, total) in self.sleeps.items()
+        ]
+        with open(path, "w") as f:
+            json.dump({
+                "total_wait_time": self.total_wait_time(),
+                "total_sleep_time": self.total_sleep_time(),
+                "waits": self.waits,
+                "sleeps": sleeps,
+            }, f, indent=4)
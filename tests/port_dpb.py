@@ -19,11 +19,11 @@ class Port():
         self._lanes_asic_db_str = None
         self._oid = None
         self._dvs = dvs
-        self._cfg_db = swsscommon.DBConnector(swsscommon.CONFIG_DB, dvs.redis_sock, 0)
+        self._cfg_db = dvs.connections.get_connector(swsscommon.CONFIG_DB)
         self._cfg_db_ptbl = swsscommon.Table(self._cfg_db, "PORT")
-        self._app_db = swsscommon.DBConnector(swsscommon.APPL_DB, dvs.redis_sock, 0)
+        self._app_db = dvs.connections.get_connector(swsscommon.APPL_DB)
         self._app_db_ptbl = swsscommon.Table(self._app_db, swsscommon.APP_PORT_TABLE_NAME)
-        self._asic_db = swsscommon.DBConnector(swsscommon.ASIC_DB, dvs.redis_sock, 0)
+        self._asic_db = dvs.connections.get_connector(swsscommon.ASIC_DB)
         self._asic_db_ptbl = swsscommon.Table(self._asic_db, "ASIC_STATE:SAI_OBJECT_TYPE_PORT")
         self._counters_db = dvs.get_counters_db()
         self._dvs_asic_db = dvs.get_asic_db()
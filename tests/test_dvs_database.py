@@ -0,0 +1,78 @@
+"""Tests for the DVSDatabase helpers of dvslib, run against the redis of the virtual switch."""
+import pytest
+
+from dvslib.dvs_common import PollingConfig
+
+
+TEST_TABLE = "DVSLIB_TEST_TABLE"
+
+
+@pytest.fixture
+def state_db(dvs):
+    db = dvs.get_state_db()
+    yield db
+
+    for table_name in [TEST_TABLE, TEST_TABLE + "_SIBLING"]:
+        for key in db.get_keys(table_name):
+            db.delete_entry(table_name, key)
+
+
+class TestTableMirror(object):
+    def test_MirrorAddAndDelete(self, state_db):
+        state_db.create_entry(TEST_TABLE, "initial", {"field": "1"})
+
+        with state_db.mirror_table(TEST_TABLE) as mirror:
+            assert mirror.get_keys() == ["initial"]
+
+            state_db.create_entry(TEST_TABLE, "added", {"field": "2"})
+            assert mirror.wait_for(lambda m: m.get_entry("added") == {"field": "2"})
+
+            state_db.delete_entry(TEST_TABLE, "initial")
+            assert mirror.wait_for(lambda m: m.get_keys() == ["added"])
+
+    def test_MirrorIgnoresSiblingTable(self, state_db):
+        with state_db.mirror_table(TEST_TABLE) as mirror:
+            state_db.create_entry(TEST_TABLE + "_SIBLING", "other", {"field": "1"})
+            state_db.create_entry(TEST_TABLE, "mine", {"field": "1"})
+            assert mirror.wait_for(lambda m: "mine" in m.get_keys())
+            assert mirror.get_keys() == ["mine"]
+
+
+class TestBatchWaits(object):
+    def test_WaitForEntries(self, state_db):
+        keys = ["key{}".format(i) for i in range(100)]
+        for key in keys:
+            state_db.create_entry(TEST_TABLE, key, {"field": key})
+
+        entries = state_db.wait_for_entries(TEST_TABLE, keys)
+        assert entries == {key: {"field": key} for key in keys}
+
+    def test_WaitForFieldMatches(self, state_db):
+        state_db.create_entry(TEST_TABLE, "key1", {"field": "1"})
+        state_db.create_entry(TEST_TABLE, "key2", {"field": "2", "other": "2"})
+
+        entries = state_db.wait_for_field_matches(TEST_TABLE, {"key1": {"field": "1"}, "key2": {"field": "2"}})
+        assert entries == {"key1": {"field": "1"}, "key2": {"field": "2", "other": "2"}}
+
+    def test_WaitForFieldMatchesReportsAllMismatches(self, state_db):
+        state_db.create_entry(TEST_TABLE, "key1", {"field": "1"})
+
+        with pytest.raises(AssertionError) as error:
+            state_db.wait_for_field_matches(TEST_TABLE, {"key1": {"field": "2"}, "key2": {"field": "2"}},
+                                            polling_config=PollingConfig(0.1, 0.5, strict=True))
+        assert "key1" in str(error.value) and "key2" in str(error.value)
+
+    def test_WaitForDeletedEntries(self, state_db):
+        keys = ["key{}".format(i) for i in range(100)]
+        for key in keys:
+            state_db.create_entry(TEST_TABLE, key, {"field": key})
+        for key in keys:
+            state_db.delete_entry(TEST_TABLE, key)
+
+        assert state_db.wait_for_deleted_entries(TEST_TABLE, keys) == {}
+
+
+# Add Dummy always-pass test at end as workaroud
+# for issue when Flaky fail on final test it invokes module tear-down before retrying
+def test_nonflaky_dummy():
+    pass
@@ -1,10 +1,10 @@
 import os
 import re
 import time
-import json
 import pytest
 
 from dvslib.dvs_common import wait_for_result
+from dvslib.dvs_sai_key import decode_sai_key
 from swsscommon import swsscommon
 
 IF_TB = 'INTERFACE'
@@ -36,7 +36,7 @@ def get_asic_route_key(asic_db, ipprefix):
     key = ''
     keys = asic_db.get_keys(ASIC_ROUTE_TB)
     for k in keys:
-        rt_key = json.loads(k)
+        rt_key = decode_sai_key(k)
 
         if rt_key['dest'] == ipprefix:
             route_exists = True
@@ -52,7 +52,7 @@ def validate_asic_nhg_fine_grained_ecmp(asic_db, ipprefix, size):
         key = ''
         route_exists = False
         for k in keys:
-            rt_key = json.loads(k)
+            rt_key = decode_sai_key(k)
             if rt_key['dest'] == ipprefix:
                 route_exists = True
                 key = k
@@ -87,7 +87,7 @@ def validate_asic_nhg_router_interface(asic_db, ipprefix):
         key = ''
         route_exists = False
         for k in keys:
-            rt_key = json.loads(k)
+            rt_key = decode_sai_key(k)
             if rt_key['dest'] == ipprefix:
                 route_exists = True
                 key = k
@@ -114,7 +114,7 @@ def validate_asic_nhg_regular_ecmp(asic_db, ipprefix):
         key = ''
         route_exists = False
         for k in keys:
-            rt_key = json.loads(k)
+            rt_key = decode_sai_key(k)
             if rt_key['dest'] == ipprefix:
                 route_exists = True
                 key = k
@@ -360,7 +360,7 @@ def fine_grained_ecmp_base_test(dvs, match_mode):
     keys = rtbl.getKeys()
     found_route = False
     for k in keys:
-        rt_key = json.loads(k)
+        rt_key = decode_sai_key(k)
 
         if rt_key['dest'] == fg_nhg_prefix:
             found_route = True
@@ -2,11 +2,11 @@ import os
 import re
 import sys
 import time
-import json
 import pytest
 import ipaddress
 
 from swsscommon import swsscommon
+from dvslib.dvs_sai_key import decode_sai_key
 
 
 class TestNextHopGroup(object):
@@ -270,7 +270,7 @@ class TestNextHopGroup(object):
 
         def asic_route_exists(keys, ipprefix):
             for k in keys:
-                rt_key = json.loads(k)
+                rt_key = decode_sai_key(k)
 
                 if rt_key['dest'] == ipprefix:
                     return k
@@ -1,11 +1,11 @@
 import os
 import re
 import time
-import json
 import pytest
 
 from swsscommon import swsscommon
 from dvslib.dvs_common import wait_for_result
+from dvslib.dvs_sai_key import decode_sai_key
 
 class TestRouteBase(object):
     def setup_db(self, dvs):
@@ -56,7 +56,7 @@ class TestRouteBase(object):
     def check_route_entries(self, destinations):
         def _access_function():
             route_entries = self.adb.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destinations = [json.loads(route_entry)["dest"]
+            route_destinations = [decode_sai_key(route_entry)["dest"]
                                   for route_entry in route_entries]
             return (all(destination in route_destinations for destination in destinations), None)
 
@@ -65,14 +65,14 @@ class TestRouteBase(object):
     def get_asic_db_key(self, destination):
         route_entries = self.adb.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
         for route_entry in route_entries:
-            if json.loads(route_entry)["dest"] == destination:
+            if decode_sai_key(route_entry)["dest"] == destination:
                 return route_entry
         return None
 
     def check_route_entries_with_vrf(self, destinations, vrf_oids):
         def _access_function():
             route_entries = self.adb.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destination_vrf = [(json.loads(route_entry)["dest"], json.loads(route_entry)["vr"])
+            route_destination_vrf = [(decode_sai_key(route_entry)["dest"], decode_sai_key(route_entry)["vr"])
                                            for route_entry in route_entries]
             return (all((destination, vrf_oid) in route_destination_vrf
                         for destination, vrf_oid in zip(destinations, vrf_oids)), None)
@@ -90,7 +90,7 @@ class TestRouteBase(object):
 
         def _access_function_route_nexthop():
             route_entries = self.adb.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destination_nexthop = dict([((json.loads(route_entry)["dest"], json.loads(route_entry)["vr"]), 
+            route_destination_nexthop = dict([((decode_sai_key(route_entry)["dest"], decode_sai_key(route_entry)["vr"]), 
                                                self.adb.get_entry("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY", route_entry).get("SAI_ROUTE_ENTRY_ATTR_NEXT_HOP_ID"))
                                                for route_entry in route_entries])
             return (all(route_destination_nexthop.get((destination, vrf_oid)) == nexthop_oids.get(nexthop)
@@ -101,7 +101,7 @@ class TestRouteBase(object):
     def check_deleted_route_entries(self, destinations):
         def _access_function():
             route_entries = self.adb.get_keys("ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY")
-            route_destinations = [json.loads(route_entry)["dest"] for route_entry in route_entries]
+            route_destinations = [decode_sai_key(route_entry)["dest"] for route_entry in route_entries]
             return (all(destination not in route_destinations for destination in destinations), None)
 
         wait_for_result(_access_function)
@@ -50,8 +50,9 @@ class TestSpeedSet:
 
             # Check that the speed was set for all "NUM_PORTS" ports
             asic_port_records = adb.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_PORT", self.NUM_PORTS + 1)  # +1 CPU Port
-            for port in [port for port in asic_port_records if port in adb.port_name_map.values()]:
-                adb.wait_for_field_match("ASIC_STATE:SAI_OBJECT_TYPE_PORT", port, {"SAI_PORT_ATTR_SPEED": speed})
+            front_panel_ports = [port for port in asic_port_records if port in adb.port_name_map.values()]
+            adb.wait_for_field_matches("ASIC_STATE:SAI_OBJECT_TYPE_PORT",
+                                       {port: {"SAI_PORT_ATTR_SPEED": speed} for port in front_panel_ports})
 
             # Check number of created profiles
             if speed not in configured_speed_list:
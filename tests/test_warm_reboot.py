@@ -5,6 +5,7 @@ import json
 import pytest
 
 from swsscommon import swsscommon
+from dvslib.dvs_database_async import wait_for_all
 
 
 # macros for number of interfaces and number of neighbors
@@ -112,10 +113,6 @@ def create_entry_pst(db, table, key, pairs):
     tbl = swsscommon.ProducerStateTable(db, table)
     create_entry(tbl, key, pairs)
 
-def how_many_entries_exist(db, table):
-    tbl =  swsscommon.Table(db, table)
-    return len(tbl.getKeys())
-
 def stop_neighsyncd(dvs):
     dvs.runcmd(['sh', '-c', 'pkill -x neighsyncd'])
 
@@ -2159,6 +2156,14 @@ class TestWarmReboot(object):
 
         (exitcode, vrf_before) = dvs.runcmd(['sh', '-c', "ip link show | grep Vrf"])
 
+        asic_db = dvs.get_asic_db()
+        asic_tables = [
+            "ASIC_STATE:SAI_OBJECT_TYPE_VIRTUAL_ROUTER",
+            "ASIC_STATE:SAI_OBJECT_TYPE_ROUTE_ENTRY",
+            "ASIC_STATE:SAI_OBJECT_TYPE_NEIGHBOR_ENTRY",
+        ]
+        asic_before = asic_db.snapshot(asic_tables)
+
         dvs.runcmd(['sh', '-c', 'pkill -x vrfmgrd'])
 
         pubsub = dvs.SubscribeAsicDbObject("SAI_OBJECT_TYPE")
@@ -2170,11 +2175,14 @@ class TestWarmReboot(object):
         (exitcode, vrf_after) = dvs.runcmd(['sh', '-c', "ip link show | grep Vrf"])
         assert vrf_after == vrf_before
 
-        # VIRTUAL_ROUTER/ROUTE_ENTRY/NEIGH_ENTRY should be kept the same
+        # No SAI object should be removed or created again, even if it ends up in the same state
         (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, ignore=["SAI_OBJECT_TYPE_FDB_ENTRY"])
         assert nadd == 0
         assert ndel == 0
 
+        # VIRTUAL_ROUTER/ROUTE_ENTRY/NEIGH_ENTRY should be kept the same
+        assert not asic_db.diff(asic_before, asic_db.snapshot(asic_tables))
+
         # new ip on server 1
         dvs.servers[1].runcmd("ifconfig eth0 13.0.0.3/24")
         dvs.servers[1].runcmd("ip route add default via 13.0.0.1")
@@ -2341,11 +2349,15 @@ class TestWarmReboot(object):
 
         # Verify that the ASIC DB is intact
         self.dvs_policer.verify_policer("test_policer")
-        state_db.wait_for_field_match("MIRROR_SESSION_TABLE", "test_session", {"status": "active"})
 
         asic_db = dvs.get_asic_db()
-        asic_db.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_ACL_TABLE", 1 + len(asic_db.default_acl_tables))
-        asic_db.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_ACL_ENTRY", 1 + len(asic_db.default_acl_entries))
+        async_state_db = dvs.get_async_db(dvs.STATE_DB_ID)
+        async_asic_db = dvs.get_async_db(dvs.ASIC_DB_ID)
+        wait_for_all(
+            async_state_db.wait_for_field_match("MIRROR_SESSION_TABLE", "test_session", {"status": "active"}),
+            async_asic_db.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_ACL_TABLE", 1 + len(asic_db.default_acl_tables)),
+            async_asic_db.wait_for_n_keys("ASIC_STATE:SAI_OBJECT_TYPE_ACL_ENTRY", 1 + len(asic_db.default_acl_entries)),
+        )
 
         # Clean up
         dvs_acl.remove_acl_rule("EVERFLOW_TEST", "TEST_RULE")